@@ -1,40 +1,161 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from difflib import get_close_matches
 import io
 import os
+import zipfile
 from datetime import datetime
-from openpyxl.utils import get_column_letter  # ✅ for Excel-style letters
+from excel_compare_engine import (
+    DEFAULT_CHUNK_SIZE,
+    CellDetailStore,
+    auto_map_sheets,
+    build_pair_tasks,
+    compare_pairs,
+    sheet_digest,
+    streaming_sheet_names,
+    type_workbook,
+)
+from excel_compare_baseline import candidate_ids, changed_cells_matrix, compare_baseline, index_baseline
+from excel_compare_cache import content_digest, load_workbook_cached
+from excel_compare_report import (
+    cell_detail_frames,
+    collect_report,
+    summary_display_cols,
+    write_baseline_matrix,
+    write_comparison_report,
+)
 
 st.set_page_config(page_title="GC Excel Comparator", layout="wide")
 
 st.title("📊 GC Excel Comparator — Auto-Mapping + Cell-Level Differences + Highlights")
 
 # --- Step 1: Upload Excel Files ---
-file1 = st.sidebar.file_uploader("Upload Workbook A", type=["xlsx", "xls"], key="f1")
-file2 = st.sidebar.file_uploader("Upload Workbook B", type=["xlsx", "xls"], key="f2")
+compare_mode = st.sidebar.radio("Comparison mode", ["Two workbooks", "Baseline vs many"])
+if compare_mode == "Two workbooks":
+    file1 = st.sidebar.file_uploader("Upload Workbook A", type=["xlsx", "xls"], key="f1")
+    file2 = st.sidebar.file_uploader("Upload Workbook B", type=["xlsx", "xls"], key="f2")
+    candidate_files = []
+else:
+    file1 = st.sidebar.file_uploader("Upload Baseline Workbook", type=["xlsx", "xls"], key="f1")
+    file2 = None
+    candidate_files = st.sidebar.file_uploader("Upload Candidate Workbooks", type=["xlsx", "xls"],
+                                               accept_multiple_files=True, key="f_many")
+streaming = st.sidebar.checkbox("Streaming mode (large .xlsx, constant memory)", False)
+max_workers = st.sidebar.number_input("Parallel workers (sheet pairs)", min_value=1, max_value=os.cpu_count() or 1, value=min(4, os.cpu_count() or 1))
+typed_mode = st.sidebar.checkbox("Typed numeric comparison (tolerances)", False, disabled=streaming)
+atol = st.sidebar.number_input("Absolute tolerance", min_value=0.0, value=0.0, format="%g", disabled=not typed_mode)
+rtol = st.sidebar.number_input("Relative tolerance", min_value=0.0, value=0.0, format="%g", disabled=not typed_mode)
+spill_format = st.sidebar.selectbox("Spill format (detail sheets over Excel's row limit)", ["csv", "parquet"])
+collapse_ranges = st.sidebar.checkbox("Collapse changed cells into ranges", False,
+                                      help="Drill-down sheets list ranges such as C2:C90211; per-cell detail goes to companion files.")
+chunk_size = st.sidebar.number_input("Streaming chunk size (rows)", min_value=1000, value=DEFAULT_CHUNK_SIZE, step=1000, disabled=not streaming)
 
 @st.cache_data
 def read_excel_sheets(uploaded_file):
     try:
-        df_dict = pd.read_excel(uploaded_file, sheet_name=None, dtype=str, header=0)
-        cleaned = {}
-        for sheet_name, df in df_dict.items():
-            df.columns = [
-                c if not str(c).startswith("Unnamed") else f"Unnamed_{i+1}"
-                for i, c in enumerate(df.columns)
-            ]
-            cleaned[sheet_name] = df
-        return cleaned
+        # on-disk cache keyed by SHA-256 of the bytes survives restarts and re-uploads
+        sheets, _, _ = load_workbook_cached(uploaded_file.getvalue())
+        return sheets
     except Exception as e:
         st.error(f"Error reading Excel file: {e}")
         return {}
 
+@st.cache_data
+def read_typed_sheets(uploaded_file):
+    # numeric columns parsed once to float64; the rest stay as strings
+    return type_workbook(read_excel_sheets(uploaded_file))
+
+@st.cache_data
+def read_sheet_digests(uploaded_file, typed, streaming):
+    # per-sheet content hashes: key the per-pair result cache used by re-runs
+    if streaming:
+        digest = content_digest(uploaded_file.getvalue())
+        return {name: f"{digest}:{name}" for name in streaming_sheet_names(uploaded_file)}
+    sheets = read_typed_sheets(uploaded_file) if typed else read_excel_sheets(uploaded_file)
+    return {name: sheet_digest(df) for name, df in sheets.items()}
+
+@st.cache_data
+def read_baseline_index(uploaded_file, typed):
+    # baseline parsed, typed and signed once for all candidates
+    return index_baseline(read_excel_sheets(uploaded_file), typed=typed)
+
+# --- Baseline vs many: one golden workbook against every candidate ---
+if compare_mode == "Baseline vs many":
+    if not (file1 and candidate_files):
+        st.info("Upload a baseline workbook and one or more candidate workbooks.")
+        st.stop()
+    if streaming:
+        st.warning("Streaming mode does not apply to baseline comparisons — workbooks are loaded in memory.")
+
+    baseline = read_baseline_index(file1, typed_mode)
+    st.success(f"✅ Baseline **{file1.name}**: {len(baseline['sheets'])} sheets, {len(candidate_files)} candidate(s)")
+
+    st.subheader("🔑 Row Alignment")
+    base_align = st.radio("Align rows by", ["Position", "Row Fingerprint", "Key Columns"], horizontal=True, key="base_align")
+    base_keys = []
+    if base_align == "Key Columns":
+        all_cols = sorted({c for df in baseline["sheets"].values() for c in df.columns}, key=str)
+        base_keys = st.multiselect("Key columns (applied to every sheet pair that has all of them)", all_cols, key="base_keys")
+
+    if st.button("🚀 Run Baseline Comparison"):
+        candidates = dict(zip(candidate_ids([f.name for f in candidate_files]), (f.getvalue() for f in candidate_files)))
+        progress_bar = st.progress(0.0, text="Comparing candidates...")
+
+        def on_candidate(done, total, rec):
+            progress_bar.progress(done / total, text=f"Compared {done}/{total}: '{rec['candidate']}' in {rec['seconds']:.2f}s")
+
+        records = compare_baseline(
+            baseline, candidates, max_workers=int(max_workers), key_cols=base_keys,
+            fingerprint=(base_align == "Row Fingerprint"), atol=float(atol), rtol=float(rtol),
+            collapse_ranges=collapse_ranges, spill_format=spill_format, on_progress=on_candidate
+        )
+        matrix = changed_cells_matrix(baseline, records)
+        errors = {rec["candidate"]: rec["error"] for rec in records if rec["status"] != "ok"}
+        for candidate, message in errors.items():
+            st.error(f"❌ {candidate}: {message}")
+
+        st.subheader("🧮 Changed Cells per Sheet per Candidate")
+        st.dataframe(matrix)
+
+        # Matrix workbook links to the per-candidate reports shipped alongside it in the zip
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        base_name = f"{os.path.splitext(file1.name)[0]}_baseline_{stamp}"
+        report_files = {rec["candidate"]: f"{rec['candidate']}_vs_baseline.xlsx" for rec in records if rec["status"] == "ok"}
+        matrix_output = io.BytesIO()
+        write_baseline_matrix(matrix_output, matrix, report_files, errors)
+
+        zip_output = io.BytesIO()
+        with zipfile.ZipFile(zip_output, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(f"{base_name}_matrix.xlsx", matrix_output.getvalue())
+            for rec in records:
+                if rec["status"] != "ok":
+                    continue
+                zf.writestr(report_files[rec["candidate"]], rec["report"])
+                for name, data in rec["companions"].items():
+                    zf.writestr(name, data)
+        st.download_button(
+            label="📦 Download Matrix + Candidate Reports (.zip)",
+            data=zip_output.getvalue(),
+            file_name=f"{base_name}.zip",
+            mime="application/zip"
+        )
+    st.stop()
+
 # --- Step 2: Load Workbooks ---
 if file1 and file2:
-    sheetsA = read_excel_sheets(file1)
-    sheetsB = read_excel_sheets(file2)
+    if streaming and (file1.name.lower().endswith(".xls") or file2.name.lower().endswith(".xls")):
+        st.error("Streaming mode supports .xlsx workbooks only.")
+        st.stop()
+
+    if streaming:
+        # sheet data is read row by row at comparison time, never loaded up front
+        sheetsA = {name: None for name in streaming_sheet_names(file1)}
+        sheetsB = {name: None for name in streaming_sheet_names(file2)}
+    elif typed_mode:
+        sheetsA = read_typed_sheets(file1)
+        sheetsB = read_typed_sheets(file2)
+    else:
+        sheetsA = read_excel_sheets(file1)
+        sheetsB = read_excel_sheets(file2)
 
     file1_name = os.path.splitext(file1.name)[0]
     file2_name = os.path.splitext(file2.name)[0]
@@ -42,13 +163,13 @@ if file1 and file2:
     st.success(f"✅ Loaded {len(sheetsA)} sheets from **{file1.name}** and {len(sheetsB)} from **{file2.name}**")
 
     # --- Step 3: Auto-Map Sheets ---
+    # content signatures (headers, row-count bucket, MinHash of leading rows) + assignment
     mapping_data = []
-    for sheetA in sheetsA.keys():
-        best_match = get_close_matches(sheetA, sheetsB.keys(), n=1, cutoff=0.6)
-        mapped_to = best_match[0] if best_match else None
+    for sheetA, mapped_to, score in auto_map_sheets(sheetsA, sheetsB):
         mapping_data.append({
             "Workbook A Sheet": sheetA,
             "Workbook B Sheet": mapped_to if mapped_to else "❌ No Match Found",
+            "Match Score": round(score, 2),
             "Skip Comparison": False
         })
 
@@ -57,138 +178,72 @@ if file1 and file2:
     st.subheader("🔗 Auto-Mapping of Sheets")
     edited_mapping = st.data_editor(mapping_df, num_rows="dynamic", key="map_editor")
 
+    # --- Row alignment: by position or by key columns ---
+    st.subheader("🔑 Row Alignment")
+    align_mode = st.radio("Align rows by", ["Position", "Row Fingerprint", "Key Columns"], horizontal=True, disabled=streaming,
+                          help="Row Fingerprint skips identical rows (matched in place first, then by row hash) and detects moved / inserted / deleted rows.")
+    key_cols = []
+    if streaming:
+        st.caption("Streaming mode compares rows by position.")
+    elif align_mode == "Key Columns":
+        all_cols_A = sorted({c for df in sheetsA.values() for c in df.columns}, key=str)
+        key_cols = st.multiselect("Key columns (applied to every sheet pair that has all of them)", all_cols_A)
+
     # --- Step 4: Comparison Logic (Summary-first + valid links + Back to Summary) ---
 if st.button("🚀 Run Comparison"):
-    summary_rows = []
-    diff_frames = {}   # store per-sheet diff DataFrames to write AFTER summary
     excel_output = io.BytesIO()
 
     base_filename = f"{file1_name}_comparison_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
 
-    # --- First pass: compute diffs and keep in memory ---
-    for _, row in edited_mapping.iterrows():
-        if row["Skip Comparison"]:
-            st.info(f"⏭️ Skipping sheet '{row['Workbook A Sheet']}'")
-            continue
-
-        sheetA_name = row["Workbook A Sheet"]
-        sheetB_name = row["Workbook B Sheet"]
-
-        if sheetB_name not in sheetsB:
-            st.warning(f"⚠️ Sheet '{sheetB_name}' not found in Workbook B — skipped")
-            continue
-
-        dfA = sheetsA[sheetA_name].fillna("")
-        dfB = sheetsB[sheetB_name].fillna("")
-
-        # Align column sets
-        common_cols = sorted(list(set(dfA.columns).intersection(set(dfB.columns))))
-        extra_cols_A = list(set(dfA.columns) - set(dfB.columns))
-        extra_cols_B = list(set(dfB.columns) - set(dfA.columns))
-
-        # Align row count
-        max_rows = max(len(dfA), len(dfB))
-        dfA = dfA.reindex(range(max_rows)).fillna("")
-        dfB = dfB.reindex(range(max_rows)).fillna("")
-
-        dfA_common = dfA[common_cols].reset_index(drop=True)
-        dfB_common = dfB[common_cols].reset_index(drop=True)
-
-        # Compare cell values
-        diff_mask = dfA_common.ne(dfB_common)
-        changed_cells = np.where(diff_mask)
-        num_changes = len(changed_cells[0])
-
-        # Build difference DataFrame
-        diff_records = []
-        for i, j in zip(*changed_cells):
-            col_name = common_cols[j]
-            try:
-                col_pos = dfA.columns.get_loc(col_name) + 1
-            except Exception:
-                col_pos = j + 1
-            excel_row_num = i + 2  # header row occupies Excel row 1
-            col_letter = get_column_letter(col_pos)
-            diff_records.append({
-                "Row Number": excel_row_num,
-                "Column Number": col_pos,
-                "Column Letter": col_letter,
-                "Column Name": col_name,
-                "Workbook A Value": dfA_common.iat[i, j],
-                "Workbook B Value": dfB_common.iat[i, j]
-            })
-        diff_df = pd.DataFrame(diff_records)
-
-        # Sanitize sheet name
-        def sanitize_sheet_name(name):
-            invalid = ['\\', '/', '*', '[', ']', ':', '?']
-            for ch in invalid:
-                name = name.replace(ch, "_")
-            name = name.strip()
-            if len(name) == 0:
-                name = "Sheet"
-            if len(name) > 28:
-                name = name[:28]
-            return name
-
-        sheet_name_safe = sanitize_sheet_name(f"{sheetA_name}_Diff")
-        base_safe = sheet_name_safe
-        idx = 1
-        while sheet_name_safe in diff_frames:
-            sheet_name_safe = f"{base_safe[:25]}_{idx}"
-            idx += 1
-
-        diff_frames[sheet_name_safe] = diff_df
-
-        summary_rows.append({
-            "Sheet A": sheetA_name,
-            "Sheet B": sheetB_name,
-            "Extra Columns in A": ", ".join(sorted(extra_cols_A)) if extra_cols_A else "None",
-            "Extra Columns in B": ", ".join(sorted(extra_cols_B)) if extra_cols_B else "None",
-            "Row Difference": len(dfA) - len(dfB),
-            "Changed Cells": num_changes,
-            "Drilldown Sheet": sheet_name_safe
-        })
+    # --- First pass: collect the sheet pairs to compare (mapping order) ---
+    mapping = [
+        (row["Workbook A Sheet"], row["Workbook B Sheet"], row["Skip Comparison"])
+        for _, row in edited_mapping.iterrows()
+    ]
+    tasks, notes = build_pair_tasks(
+        sheetsA, sheetsB, mapping, key_cols=key_cols,
+        fingerprint=(align_mode == "Row Fingerprint"), atol=float(atol), rtol=float(rtol),
+        sourceA=file1.getvalue() if streaming else None,
+        sourceB=file2.getvalue() if streaming else None,
+        chunk_size=int(chunk_size),
+        digestsA=read_sheet_digests(file1, typed_mode, streaming),
+        digestsB=read_sheet_digests(file2, typed_mode, streaming)
+    )
+    for level, message in notes:
+        (st.info if level == "info" else st.warning)(message)
+
+    # --- Second pass: compare pairs (process pool) and keep diffs in memory ---
+    progress_bar = st.progress(0.0, text="Comparing sheets...")
+    progress_log = st.empty()
+    timings = []
+
+    def on_progress(done, total, task, elapsed):
+        timings.append({"Sheet A": task["sheetA"], "Sheet B": task["sheetB"], "Seconds": round(elapsed, 3)})
+        progress_bar.progress(done / total, text=f"Compared {done}/{total}: '{task['sheetA']}' in {elapsed:.2f}s")
+        progress_log.dataframe(pd.DataFrame(timings), hide_index=True)
+
+    # pairs whose sheets and options are unchanged since the last run are reused, not recomputed
+    pair_results = st.session_state.setdefault("pair_results", {})
+    results = compare_pairs(tasks, max_workers=int(max_workers), on_progress=on_progress, result_cache=pair_results)
+    st.session_state["pair_results"] = {task["cache_key"]: result for task, result in zip(tasks, results)}
+    reused = sum(1 for result in results if result.get("cached"))
+    if reused:
+        st.caption(f"♻️ {reused} of {len(tasks)} sheet pair(s) unchanged since the last run — results reused.")
+
+    summary_rows, diff_frames = collect_report(tasks, results, collapse_ranges=collapse_ranges)
+    cell_frames = cell_detail_frames(summary_rows, results) if collapse_ranges else None
+
+    # --- Write Excel file: Summary first, then details (constant memory, spill > row limit) ---
+    display_cols = summary_display_cols(
+        key_cols, fingerprint=(align_mode == "Row Fingerprint" and not streaming), collapse_ranges=collapse_ranges
+    )
+    companion_files = write_comparison_report(
+        excel_output, summary_rows, diff_frames, display_cols,
+        base_name=os.path.splitext(base_filename)[0], spill_format=spill_format, cell_frames=cell_frames
+    )
 
-    # --- Write Excel file: Summary first, then details ---
-    with pd.ExcelWriter(excel_output, engine="xlsxwriter") as writer:
-        workbook = writer.book
-        link_fmt = workbook.add_format({'font_color': 'blue', 'underline': 1})
-        highlight_fmt = workbook.add_format({"bg_color": "#FFF59D", "font_color": "#000000"})
-
-        summary_df_full = pd.DataFrame(summary_rows)
-        display_cols = ["Sheet A", "Sheet B", "Extra Columns in A", "Extra Columns in B", "Row Difference", "Changed Cells"]
-        summary_display = summary_df_full[display_cols]
-
-        # Write summary
-        summary_display.to_excel(writer, sheet_name="Summary", index=False, startcol=1)
-        worksheet_summary = writer.sheets["Summary"]
-        worksheet_summary.set_column(0, 0, 18)
-        worksheet_summary.set_column(1, len(display_cols), 25)
-        worksheet_summary.write(0, 0, "Drilldown")
-
-        # Fix Drilldown column to show text "Go to Diff"
-        for idx, rec in enumerate(summary_df_full.itertuples(index=False), start=1):
-            drill_sheet = getattr(rec, "Drilldown Sheet", summary_df_full.iloc[idx-1]["Drilldown Sheet"])
-            formula = f'=HYPERLINK("#\'{drill_sheet}\'!A1","Go to Diff")'
-            worksheet_summary.write_formula(idx, 0, formula, link_fmt)
-
-        # --- Write detail sheets ---
-        for sheet_name_safe, diff_df in diff_frames.items():
-            if diff_df is None or diff_df.empty:
-                pd.DataFrame([{"Status": "No Differences Found"}]).to_excel(writer, index=False, sheet_name=sheet_name_safe)
-            else:
-                diff_df.to_excel(writer, index=False, sheet_name=sheet_name_safe, startrow=2)
-                worksheet = writer.sheets[sheet_name_safe]
-
-                # Add "Back to Summary" link at A1
-                back_link = '=HYPERLINK("#Summary!A1","Back to Summary")'
-                worksheet.write_formula(0, 0, back_link, link_fmt)
-
-                # Formatting
-                worksheet.set_column(0, diff_df.shape[1]-1, 20)
-                for r in range(3, len(diff_df) + 3):
-                    worksheet.set_row(r, None, highlight_fmt)
+    # Per-cell detail behind the ranges, queried on demand below (survives reruns)
+    st.session_state["cell_stores"] = {sheet: CellDetailStore(df) for sheet, df in (cell_frames or {}).items()}
 
     excel_output.seek(0)
 
@@ -201,3 +256,30 @@ if st.button("🚀 Run Comparison"):
         file_name=base_filename,
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
+
+    # Detail sheets over Excel's row limit live in companion files next to the report
+    if companion_files:
+        zip_output = io.BytesIO()
+        with zipfile.ZipFile(zip_output, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(base_filename, excel_output.getvalue())
+            for name, data in companion_files.items():
+                zf.writestr(name, data)
+        st.info(f"ℹ️ {len(companion_files)} companion {spill_format.upper()} file(s): per-cell detail and detail sheets over Excel's row limit.")
+        st.download_button(
+            label="📦 Download Report + Detail Files (.zip)",
+            data=zip_output.getvalue(),
+            file_name=f"{os.path.splitext(base_filename)[0]}.zip",
+            mime="application/zip"
+        )
+
+# --- Per-cell detail for a changed range (range-collapsed reports) ---
+if st.session_state.get("cell_stores"):
+    st.subheader("🔍 Changed Cells in a Range")
+    stores = st.session_state["cell_stores"]
+    detail_sheet = st.selectbox("Drill-down sheet", list(stores))
+    range_ref = st.text_input("Range (e.g. C2:C90211)", "")
+    if range_ref:
+        try:
+            st.dataframe(stores[detail_sheet].cells(range_ref), hide_index=True)
+        except ValueError:
+            st.error(f"'{range_ref}' is not a valid cell range.")
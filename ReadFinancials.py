@@ -1,117 +1,127 @@
 import streamlit as st
 import pandas as pd
 import io
+import os
+from financials_engine import (
+    ALL_SHEETS,
+    EXPORT_MIME,
+    SHEET_COL,
+    FinancialsStore,
+    HierarchyIndex,
+    cached_export,
+    export_formats,
+    flatten_sheet,
+    flatten_workbook,
+    sheet_digest,
+    write_export,
+)
 
 st.set_page_config(page_title="Financial Excel Hierarchy Explorer", layout="wide")
 st.title("📘 Financial Excel Hierarchy Explorer")
 
 uploaded_file = st.file_uploader("Upload Financials Excel", type=["xlsx", "xls"])
 
+CACHED_STORES = 8  # flattened stores kept across reruns / sessions; older uploads are dropped
+
+@st.cache_data
+def read_sheet_names(uploaded_file):
+    with pd.ExcelFile(io.BytesIO(uploaded_file.getvalue())) as xls:
+        return list(xls.sheet_names)
+
+@st.cache_resource(max_entries=CACHED_STORES)
+def load_store(uploaded_file, sheet):
+    # only the compact typed store is kept: categorical dimensions + float64 Value
+    if sheet == ALL_SHEETS:
+        # every sheet parsed once and flattened in parallel into one long table
+        melted, skipped = flatten_workbook(uploaded_file.getvalue(), max_workers=os.cpu_count() or 1)
+        return None, skipped, FinancialsStore.from_long(melted)
+    raw = pd.read_excel(io.BytesIO(uploaded_file.getvalue()), sheet_name=sheet, header=None)
+    df, melted = flatten_sheet(raw)
+    return df.head(10), [], FinancialsStore.from_long(melted)
+
+@st.cache_resource(max_entries=CACHED_STORES)
+def load_hierarchy_index(uploaded_file, sheet):
+    # built once per sheet; dropdowns and the value lookup never scan the long table again
+    _, _, store = load_store(uploaded_file, sheet)
+    return HierarchyIndex(store, levels=store.dims)
+
+def upload_sheet_digest(uploaded_file, sheet):
+    # hashing the whole upload on every rerun (any widget change) is slow: once per upload + sheet
+    digests = st.session_state.setdefault("sheet_digests", {})
+    key = (uploaded_file.file_id, sheet)
+    if key not in digests:
+        digests[key] = sheet_digest(uploaded_file.getvalue(), sheet)
+    return digests[key]
+
 if uploaded_file:
-    xls = pd.ExcelFile(uploaded_file)
-    sheet = st.selectbox("Select a Sheet", xls.sheet_names)
+    bulk = st.checkbox("Flatten all sheets at once (bulk)", False)
+
+    if bulk:
+        sheet = ALL_SHEETS
+        _, skipped, store = load_store(uploaded_file, sheet)
+        for name, error in skipped:
+            st.warning(f"⚠️ Sheet '{name}' skipped: {error}")
+
+        st.subheader("📊 Flattened Sheets")
+        st.dataframe(store.frame[SHEET_COL].value_counts(sort=False).rename("Rows"))
+    else:
+        sheet = st.selectbox("Select a Sheet", read_sheet_names(uploaded_file))
 
     if sheet:
-        # Step 1: Read Excel
-        raw = pd.read_excel(uploaded_file, sheet_name=sheet, header=None)
-        header_rows = raw.iloc[0:3, :]  # first 3 rows = headers
-        data_rows = raw.iloc[3:, :].reset_index(drop=True)
-
-        # Step 2: Build MultiIndex columns
-        multi_cols = pd.MultiIndex.from_arrays(header_rows.values, names=["Category", "Subcategory", "Year"])
-        df = pd.DataFrame(data_rows.values, columns=multi_cols)
-        df.rename(columns={df.columns[0]: ("Section", "", "")}, inplace=True)
-        df = df.loc[:, ~df.columns.duplicated()]
-
-        st.subheader("📊 Parsed Data Preview")
-        st.dataframe(df.head(10))
-
-        # Step 3: Flatten to long format
-        melted = df.melt(
-            id_vars=[("Section", "", "")],
-            var_name=["Category", "Subcategory", "Year"],
-            value_name="Value"
-        )
-        melted.rename(columns={("Section", "", ""): "Section"}, inplace=True)
-
-        # Clean nulls
-        for col in ["Section", "Category", "Subcategory", "Year"]:
-            melted[col] = melted[col].fillna("").astype(str).str.strip()
-
-        # Step 4: Dropdown selectors (dynamic)
+        if not bulk:
+            # Steps 1-3: read, build MultiIndex columns, flatten to long format (cached per sheet)
+            preview, _, store = load_store(uploaded_file, sheet)
+
+            st.subheader("📊 Parsed Data Preview")
+            st.dataframe(preview)
+
+        hierarchy = load_hierarchy_index(uploaded_file, sheet)
+        st.caption(f"{len(store):,} data points, {store.memory_usage() / 2 ** 20:.1f} MB in memory")
+
+        # Step 4: Dropdown selectors (dynamic), one per hierarchy level
         st.subheader("🎯 Fetch a Specific Data Point")
 
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            section = st.selectbox(
-                "Section",
-                sorted(melted["Section"].unique()),
-                index=None,
-                placeholder="Select a Section"
-            )
-        with col2:
-            options_cat = sorted(melted[melted["Section"] == section]["Category"].unique()) if section else []
-            category = st.selectbox("Category", options_cat, index=None, placeholder="Select a Category")
-        with col3:
-            options_sub = sorted(melted[
-                (melted["Section"] == section) &
-                (melted["Category"] == category)
-            ]["Subcategory"].unique()) if category else []
-            subcategory = st.selectbox("Subcategory", options_sub, index=None, placeholder="Select a Subcategory")
-        with col4:
-            options_year = sorted(melted[
-                (melted["Section"] == section) &
-                (melted["Category"] == category) &
-                (melted["Subcategory"] == subcategory)
-            ]["Year"].unique()) if subcategory else []
-            year = st.selectbox("Year", options_year, index=None, placeholder="Select a Year")
+        path = []
+        for level, column in zip(hierarchy.levels, st.columns(len(hierarchy.levels))):
+            with column:
+                options = hierarchy.options(*path) if len(path) == hierarchy.levels.index(level) else []
+                choice = st.selectbox(level, options, index=None, placeholder=f"Select a {level}")
+            if choice and len(path) == hierarchy.levels.index(level):
+                path.append(choice)
 
         # Step 5: Value lookup
-        if section and category and subcategory and year:
-            result = melted[
-                (melted["Section"] == section) &
-                (melted["Category"] == category) &
-                (melted["Subcategory"] == subcategory) &
-                (melted["Year"] == year)
-            ]
-            if not result.empty:
-                val = result["Value"].values[0]
-                st.success(f"📈 Value for *{section} → {category} → {subcategory} → {year}* = **{val}**")
-            else:
+        if len(path) == len(hierarchy.levels):
+            try:
+                val = hierarchy.value(*path)
+                st.success(f"📈 Value for *{' → '.join(map(str, path))}* = **{val}**")
+            except KeyError:
                 st.warning("No matching data found.")
         else:
             st.info("Please select all levels to fetch a value.")
 
-        # Step 6: Downloadable data
+        # Step 6: Downloadable data (generated only on request, cached on disk by content hash)
         st.subheader("📥 Download Flattened Data")
 
-        def to_excel(df):
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-                df.to_excel(writer, index=False, sheet_name="Flattened_Data")
-            return buffer.getvalue()
-
-        excel_bytes = to_excel(melted)
-        csv_bytes = melted.to_csv(index=False).encode("utf-8")
-
-        colA, colB = st.columns(2)
-        with colA:
-            st.download_button(
-                label="⬇️ Download as Excel",
-                data=excel_bytes,
-                file_name=f"{sheet}_Flattened.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        with colB:
-            st.download_button(
-                label="⬇️ Download as CSV",
-                data=csv_bytes,
-                file_name=f"{sheet}_Flattened.csv",
-                mime="text/csv"
-            )
+        digest = upload_sheet_digest(uploaded_file, sheet)
+        export_name = "All_Sheets" if bulk else sheet
+        export_fmt = st.radio("Format", export_formats(), horizontal=True,
+                              format_func=lambda f: {"xlsx": "Excel", "csv": "CSV", "parquet": "Parquet (zstd)"}[f])
+        export_file = cached_export(digest, export_fmt)
+        if export_file is None and st.button("⚙️ Prepare Download"):
+            with st.spinner("Writing export..."):
+                export_file = write_export(store.frame, digest, export_fmt)
+
+        if export_file:
+            with open(export_file, "rb") as f:
+                st.download_button(
+                    label=f"⬇️ Download as {export_fmt.upper()}",
+                    data=f,
+                    file_name=f"{export_name}_Flattened.{export_fmt}",
+                    mime=EXPORT_MIME[export_fmt]
+                )
 
         # Optional expanded view
         with st.expander("🔍 View Flattened DataFrame"):
-            st.dataframe(melted)
+            st.dataframe(store.frame)
 else:
     st.info("Please upload your Excel file to begin.")
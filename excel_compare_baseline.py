@@ -0,0 +1,158 @@
+"""
+One baseline workbook against many candidates.
+
+The baseline is parsed, typed and signed (auto-mapping signatures) once, then handed to
+each worker process a single time through the pool initializer; workers only parse and
+compare their candidates. Results feed a sheet x candidate matrix of changed-cell counts
+next to the per-candidate drill-down reports.
+"""
+import io
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from excel_compare_cache import DEFAULT_CACHE_DIR, WorkbookCache, load_workbook_cached
+from excel_compare_engine import (
+    auto_map_sheets,
+    build_pair_tasks,
+    compare_pairs,
+    type_workbook,
+    workbook_signatures,
+)
+from excel_compare_report import (
+    cell_detail_frames,
+    collect_report,
+    summary_display_cols,
+    write_comparison_report,
+)
+
+# =====================================================
+# BASELINE INDEX
+# =====================================================
+
+def index_baseline(sheets, typed=False):
+    """Everything candidates are compared against, computed once: sheets (typed if asked) and signatures."""
+    if typed:
+        sheets = type_workbook(sheets)
+    return {"sheets": sheets, "signatures": workbook_signatures(sheets), "typed": typed}
+
+
+def candidate_ids(names):
+    """
+    Report id per candidate file name or path, in order: the sanitized file stem, with
+    _2, _3, ... for stems seen before (same-named files from different folders).
+    """
+    ids, seen = [], set()
+    for name in names:
+        stem = re.sub(r"[^\w\-.]+", "_", os.path.splitext(os.path.basename(name))[0])
+        cid, n = stem, 1
+        while cid in seen:
+            n += 1
+            cid = f"{stem}_{n}"
+        seen.add(cid)
+        ids.append(cid)
+    return ids
+
+
+_BASELINE = None
+
+
+def _init_baseline_worker(baseline):
+    """Pool initializer: the baseline index arrives once per worker, not once per candidate."""
+    global _BASELINE
+    _BASELINE = baseline
+
+# =====================================================
+# ONE CANDIDATE (runs in a worker process)
+# =====================================================
+
+def compare_candidate(job):
+    """
+    Compare one candidate workbook (bytes) against the worker's baseline and build its report.
+    Returns a record with per-sheet changed cells, the report bytes and companion files.
+    """
+    start = time.perf_counter()
+    rec = {
+        "candidate": job["candidate"], "status": "ok", "changed": {}, "mapping": {},
+        "report": None, "companions": {}, "error": ""
+    }
+    try:
+        baseline = _BASELINE
+        cache = WorkbookCache(job["cache_dir"]) if job.get("cache_dir") else None
+        sheetsB, _, _ = load_workbook_cached(job["data"], cache)
+        if baseline["typed"]:
+            sheetsB = type_workbook(sheetsB)
+
+        auto = auto_map_sheets(baseline["sheets"], sheetsB, signaturesA=baseline["signatures"])
+        mapping = [(a, b, False) for a, b, _ in auto if b is not None]
+        rec["mapping"] = {a: b for a, b, _ in mapping}
+
+        tasks, _ = build_pair_tasks(
+            baseline["sheets"], sheetsB, mapping, key_cols=job["key_cols"], fingerprint=job["fingerprint"],
+            atol=job["atol"], rtol=job["rtol"]
+        )
+        results = compare_pairs(tasks)
+        rec["changed"] = {task["sheetA"]: int(r["changed_cells"]) for task, r in zip(tasks, results)}
+
+        summary_rows, diff_frames = collect_report(tasks, results, collapse_ranges=job["collapse_ranges"])
+        cell_frames = cell_detail_frames(summary_rows, results) if job["collapse_ranges"] else None
+        output = io.BytesIO()
+        rec["companions"] = write_comparison_report(
+            output, summary_rows, diff_frames,
+            summary_display_cols(job["key_cols"], job["fingerprint"], job["collapse_ranges"]),
+            base_name=job["base_name"], spill_format=job["spill_format"], cell_frames=cell_frames
+        )
+        rec["report"] = output.getvalue()
+    except Exception as e:
+        rec["status"] = "error"
+        rec["error"] = f"{type(e).__name__}: {e}"
+    rec["seconds"] = round(time.perf_counter() - start, 3)
+    return rec
+
+# =====================================================
+# DRIVER + MATRIX
+# =====================================================
+
+def compare_baseline(baseline, candidates, max_workers=1, key_cols=None, fingerprint=False, atol=0.0, rtol=0.0,
+                     collapse_ranges=False, spill_format="csv", cache_dir=DEFAULT_CACHE_DIR, on_progress=None):
+    """
+    Compare every candidate ({name: workbook bytes}) against `baseline` (see index_baseline).
+    Records come back in candidate order; `on_progress(done, total, record)` runs as each finishes.
+    """
+    names = list(candidates)
+    jobs = [{
+        "candidate": name, "data": candidates[name], "base_name": f"{name}_vs_baseline",
+        "key_cols": list(key_cols or []), "fingerprint": fingerprint, "atol": atol, "rtol": rtol,
+        "collapse_ranges": collapse_ranges, "spill_format": spill_format, "cache_dir": cache_dir
+    } for name in names]
+    records = [None] * len(jobs)
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        _init_baseline_worker(baseline)
+        for i, job in enumerate(jobs):
+            records[i] = compare_candidate(job)
+            if on_progress:
+                on_progress(i + 1, len(jobs), records[i])
+        return records
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs)),
+                             initializer=_init_baseline_worker, initargs=(baseline,)) as pool:
+        futures = {pool.submit(compare_candidate, job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            records[i] = future.result()
+            if on_progress:
+                on_progress(done, len(jobs), records[i])
+    return records
+
+
+def changed_cells_matrix(baseline, records):
+    """Baseline sheets x candidates: changed cells per mapped sheet (blank where unmapped or failed)."""
+    matrix = pd.DataFrame(
+        {rec["candidate"]: pd.Series(rec["changed"], dtype="Int64") for rec in records},
+        index=pd.Index(list(baseline["sheets"]), name="Baseline Sheet")
+    )
+    return matrix.reindex(columns=[rec["candidate"] for rec in records])
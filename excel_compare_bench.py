@@ -0,0 +1,268 @@
+"""
+Benchmarks for the ExcelComparison engine, on synthetic workbook pairs.
+
+    python excel_compare_bench.py --rows 10000 100000 --cols 20 --sheets 4 --density 0.01
+    python excel_compare_bench.py --rows 50000 --align fingerprint --typed --out bench_results
+    python excel_compare_bench.py --compare bench_results/run_a.json bench_results/run_b.json
+
+Each run generates a workbook pair (rows x cols per sheet, `density` = fraction of cells
+changed in B), then times the three stages separately: parse, diff and report writing.
+Peak traced memory per stage comes from a second pass under tracemalloc (skip it with
+--no-trace-memory); worker processes are not traced. Results are written as JSON so
+runs can be compared later.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from excel_compare_engine import auto_map_sheets, build_pair_tasks, compare_pairs, parse_workbook, type_workbook
+from excel_compare_report import collect_report, summary_display_cols, write_comparison_report
+
+# =====================================================
+# SYNTHETIC WORKBOOKS
+# =====================================================
+
+def _sheet_values(rng, rows, cols):
+    """Mix of integer, decimal and short text columns."""
+    columns = []
+    for c in range(cols):
+        kind = c % 3
+        if kind == 0:
+            columns.append(rng.integers(0, 1_000_000, rows).astype(str))
+        elif kind == 1:
+            columns.append(np.char.mod("%.2f", rng.random(rows) * 10_000))
+        else:
+            columns.append(np.char.add("item_", rng.integers(0, 5_000, rows).astype(str)))
+    return np.column_stack(columns).astype(object) if cols else np.empty((rows, 0), dtype=object)
+
+
+def _write_sheet(workbook, name, header, values):
+    ws = workbook.add_worksheet(name)
+    ws.write_row(0, 0, header)
+    for r, row in enumerate(values, start=1):
+        ws.write_row(r, 0, row)
+
+
+def generate_workbook_pair(path_a, path_b, rows=10_000, cols=20, sheets=1, density=0.01, seed=0):
+    """
+    Write two .xlsx files with `sheets` sheets of rows x cols each; B differs from A in
+    round(density * rows * cols) cells per sheet. Returns the number of changed cells.
+    """
+    rng = np.random.default_rng(seed)
+    header = [f"Col_{c + 1}" for c in range(cols)]
+    opts = {"constant_memory": True}
+    wb_a = xlsxwriter.Workbook(path_a, opts)
+    wb_b = xlsxwriter.Workbook(path_b, opts)
+    changed = 0
+    for s in range(sheets):
+        values = _sheet_values(rng, rows, cols)
+        _write_sheet(wb_a, f"Sheet_{s + 1}", header, values)
+
+        n_changes = int(round(density * rows * cols))
+        if n_changes:
+            flat = rng.choice(rows * cols, size=min(n_changes, rows * cols), replace=False)
+            r, c = np.divmod(flat, cols)
+            values = values.copy()
+            values[r, c] = np.char.add("chg_", rng.integers(0, 1_000_000, len(flat)).astype(str))
+            changed += len(flat)
+        _write_sheet(wb_b, f"Sheet_{s + 1}", header, values)
+    wb_a.close()
+    wb_b.close()
+    return changed
+
+# =====================================================
+# STAGE TIMING
+# =====================================================
+
+class Stage:
+    """Context manager recording wall time, or tracemalloc peak when `trace_memory` is set, for one stage."""
+
+    def __init__(self, results, name, trace_memory=False):
+        self.results = results
+        self.name = name
+        self.trace_memory = trace_memory
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        record = self.results.setdefault(self.name, {})
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            record["peak_mb"] = round(peak / 2 ** 20, 2)
+        else:
+            record["seconds"] = round(seconds, 4)
+        return False
+
+
+def _pipeline(path_a, path_b, stages, key_cols, fingerprint, typed, workers, trace_memory):
+    """parse -> diff -> report, each stage wrapped in a Stage; returns the diff results."""
+    with Stage(stages, "parse", trace_memory):
+        sheetsA = parse_workbook(path_a)
+        sheetsB = parse_workbook(path_b)
+        if typed:
+            sheetsA, sheetsB = type_workbook(sheetsA), type_workbook(sheetsB)
+
+    with Stage(stages, "diff", trace_memory):
+        mapping = [(a, b, False) for a, b, _ in auto_map_sheets(sheetsA, sheetsB) if b is not None]
+        tasks, _ = build_pair_tasks(sheetsA, sheetsB, mapping, key_cols=key_cols, fingerprint=fingerprint)
+        results = compare_pairs(tasks, max_workers=workers)
+
+    with Stage(stages, "report", trace_memory):
+        summary_rows, diff_frames = collect_report(tasks, results)
+        write_comparison_report(io.BytesIO(), summary_rows, diff_frames, summary_display_cols(key_cols, fingerprint))
+    return results
+
+
+def _max_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 2)
+    except Exception:
+        return None
+
+
+def run_benchmark(rows, cols, sheets, density, align="position", key_cols=None, typed=False,
+                  workers=1, trace_memory=True, seed=0, work_dir=None):
+    """Generate one workbook pair and time parse / diff / report; returns the result record."""
+    work_dir = work_dir or tempfile.mkdtemp(prefix="excel_compare_bench_")
+    path_a = os.path.join(work_dir, f"bench_a_{rows}x{cols}x{sheets}.xlsx")
+    path_b = os.path.join(work_dir, f"bench_b_{rows}x{cols}x{sheets}.xlsx")
+    start = time.perf_counter()
+    expected = generate_workbook_pair(path_a, path_b, rows, cols, sheets, density, seed)
+    generate_seconds = time.perf_counter() - start
+
+    # timing pass first; tracemalloc slows pure-Python parsing several times over,
+    # so peak memory comes from a second, traced pass
+    fingerprint = align == "fingerprint"
+    stages = {}
+    results = _pipeline(path_a, path_b, stages, key_cols, fingerprint, typed, workers, trace_memory=False)
+    if trace_memory:
+        _pipeline(path_a, path_b, stages, key_cols, fingerprint, typed, workers, trace_memory=True)
+
+    for path in (path_a, path_b):
+        os.remove(path)
+
+    return {
+        "config": {
+            "rows": rows, "cols": cols, "sheets": sheets, "density": density, "align": align,
+            "key_cols": list(key_cols or []), "typed": typed, "workers": workers, "seed": seed,
+            "trace_memory": trace_memory
+        },
+        "generate_seconds": round(generate_seconds, 4),
+        "stages": stages,
+        "total_seconds": round(sum(s["seconds"] for s in stages.values()), 4),
+        "expected_changed_cells": expected,
+        "changed_cells": int(sum(r["changed_cells"] for r in results)),
+        "max_rss_mb": _max_rss_mb()
+    }
+
+# =====================================================
+# RESULTS
+# =====================================================
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count()
+    }
+
+
+def save_results(runs, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(out_dir, f"bench_{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": stamp, "environment": environment(), "runs": runs}, f, indent=2)
+    return path
+
+
+def _run_key(run):
+    cfg = run["config"]
+    return (cfg["rows"], cfg["cols"], cfg["sheets"], cfg["density"], cfg["align"], cfg["typed"], cfg["workers"])
+
+
+def compare_results(path_old, path_new):
+    """Per-stage timing ratio (new / old) for runs with the same configuration."""
+    with open(path_old, encoding="utf-8") as f:
+        old = {_run_key(r): r for r in json.load(f)["runs"]}
+    with open(path_new, encoding="utf-8") as f:
+        new = {_run_key(r): r for r in json.load(f)["runs"]}
+    rows = []
+    for key in sorted(set(old) & set(new)):
+        for stage in ("parse", "diff", "report"):
+            before = old[key]["stages"][stage]["seconds"]
+            after = new[key]["stages"][stage]["seconds"]
+            rows.append({
+                "rows": key[0], "cols": key[1], "sheets": key[2], "density": key[3], "align": key[4],
+                "stage": stage, "old_s": before, "new_s": after,
+                "ratio": round(after / before, 3) if before else None
+            })
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Excel comparison engine on synthetic workbooks.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--cols", type=int, nargs="+", default=[20])
+    parser.add_argument("--sheets", type=int, nargs="+", default=[1])
+    parser.add_argument("--density", type=float, nargs="+", default=[0.01], help="Fraction of cells changed")
+    parser.add_argument("--align", choices=["position", "fingerprint", "key"], default="position")
+    parser.add_argument("--keys", default="Col_1", help="Comma-separated key columns (with --align key)")
+    parser.add_argument("--typed", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-trace-memory", action="store_true", help="Skip the tracemalloc pass (timings only)")
+    parser.add_argument("--out", default="bench_results", help="Directory for the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD_JSON", "NEW_JSON"), help="Compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(compare_results(*args.compare).to_string(index=False))
+        return 0
+
+    key_cols = [k.strip() for k in args.keys.split(",") if k.strip()] if args.align == "key" else None
+    runs = []
+    for rows in args.rows:
+        for cols in args.cols:
+            for sheets in args.sheets:
+                for density in args.density:
+                    run = run_benchmark(
+                        rows, cols, sheets, density, align=args.align, key_cols=key_cols,
+                        typed=args.typed, workers=args.workers,
+                        trace_memory=not args.no_trace_memory, seed=args.seed
+                    )
+                    runs.append(run)
+                    stages = ", ".join(
+                        f"{name} {s['seconds']:.2f}s" + (f" / {s['peak_mb']:.0f} MB" if "peak_mb" in s else "")
+                        for name, s in run["stages"].items()
+                    )
+                    print(f"{rows} x {cols} x {sheets} @ {density}: {stages} "
+                          f"({run['changed_cells']} changed cells)")
+
+    print(f"Results: {save_results(runs, args.out)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import hashlib
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from excel_compare_engine import parse_workbook
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "EXCEL_COMPARE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "gc_excel_comparator")
+)
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get("EXCEL_COMPARE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+MANIFEST_FILE = "manifest.pkl"
+
+try:
+    import pyarrow  # noqa: F401
+    SHEET_FORMAT = "parquet"
+except Exception:
+    SHEET_FORMAT = "pkl"
+
+
+def content_digest(data):
+    """SHA-256 hex digest of the raw file bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+# =====================================================
+# ON-DISK WORKBOOK CACHE
+# =====================================================
+
+class WorkbookCache:
+    """
+    Content-addressed cache of parsed workbooks.
+    One directory per SHA-256 digest holding each sheet as Parquet (pickle without pyarrow)
+    plus a manifest with sheet order and original column labels. Directory mtimes track
+    recency; the least recently used entries are evicted above `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, digest):
+        return os.path.join(self.cache_dir, digest)
+
+    def get(self, digest):
+        """Parsed sheets for `digest`, or None on a miss."""
+        entry = self._entry_dir(digest)
+        manifest_path = os.path.join(entry, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path, "rb") as f:
+                manifest = pickle.load(f)
+            sheets = {}
+            for item in manifest["sheets"]:
+                path = os.path.join(entry, item["file"])
+                if item["file"].endswith(".parquet"):
+                    df = pd.read_parquet(path)
+                else:
+                    df = pd.read_pickle(path)
+                df.columns = item["columns"]
+                sheets[item["name"]] = df
+        except Exception:
+            # unreadable / partially evicted entry: treat as a miss
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        self._touch(entry)
+        return sheets
+
+    @staticmethod
+    def _touch(entry):
+        try:
+            os.utime(entry, None)
+        except FileNotFoundError:
+            pass  # evicted meanwhile
+
+    def put(self, digest, sheets):
+        """Store parsed sheets under `digest` (written to a temp dir, then renamed)."""
+        entry = self._entry_dir(digest)
+        if os.path.exists(entry):
+            self._touch(entry)
+            return
+        # unique per writer: Streamlit sessions are threads of one process
+        staging = tempfile.mkdtemp(prefix=f"{digest}.tmp", dir=self.cache_dir)
+        manifest = {"created": time.time(), "sheets": []}
+        for i, (name, df) in enumerate(sheets.items()):
+            file_name = f"sheet_{i}.{SHEET_FORMAT}"
+            # positional column names: Parquet needs unique string labels
+            stored = df.set_axis([f"c{j}" for j in range(df.shape[1])], axis=1)
+            if SHEET_FORMAT == "parquet":
+                stored.to_parquet(os.path.join(staging, file_name), index=False)
+            else:
+                stored.to_pickle(os.path.join(staging, file_name))
+            manifest["sheets"].append({"name": name, "file": file_name, "columns": list(df.columns)})
+        with open(os.path.join(staging, MANIFEST_FILE), "wb") as f:
+            pickle.dump(manifest, f)
+        try:
+            os.replace(staging, entry)
+        except OSError:
+            # another process stored the same content first
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def _entries(self):
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(path) or ".tmp" in name:
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+                )
+                yield path, os.path.getmtime(path), size
+            except FileNotFoundError:
+                continue  # removed by a concurrent eviction
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in `max_bytes`."""
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                shutil.rmtree(path)
+            except FileNotFoundError:
+                pass  # already evicted by another writer
+            except OSError:
+                continue
+            total -= size
+
+
+def load_workbook_cached(data, cache=None):
+    """
+    Parsed sheets for workbook bytes `data`, served from the on-disk cache when the same
+    content was parsed before. Returns (sheets, digest, cache_hit).
+    """
+    cache = cache or WorkbookCache()
+    digest = content_digest(data)
+    sheets = cache.get(digest)
+    if sheets is not None:
+        return sheets, digest, True
+    sheets = parse_workbook(io.BytesIO(data))
+    cache.put(digest, sheets)
+    return sheets, digest, False
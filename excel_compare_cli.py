@@ -0,0 +1,352 @@
+"""
+Headless batch comparator: runs the ExcelComparison engine over many workbook pairs.
+
+    python excel_compare_cli.py --dir-a baseline/ --dir-b submissions/ --out reports/ --workers 8
+    python excel_compare_cli.py --manifest pairs.csv --out reports/ --align fingerprint --typed
+    python excel_compare_cli.py --baseline golden.xlsx --dir-b submissions/ --out reports/
+
+Pairs come from two directories (matched by file name) or a manifest CSV with
+`workbook_a,workbook_b` columns. Each pair gets its own highlighted report in --out,
+plus batch_summary.csv for the whole run. Finished pairs are recorded in
+_batch_state.jsonl, so re-running the same command resumes where it stopped; pairs
+finished with different compare options (alignment, keys, tolerances, ...) run again.
+
+With --baseline every workbook in --dir-b is compared against the one baseline, which
+is parsed once; baseline_matrix.xlsx / .csv hold changed cells per sheet per candidate.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from excel_compare_baseline import candidate_ids, changed_cells_matrix, compare_baseline, index_baseline
+from excel_compare_cache import DEFAULT_CACHE_DIR, WorkbookCache, load_workbook_cached
+from excel_compare_engine import (
+    auto_map_sheets,
+    build_pair_tasks,
+    compare_pairs,
+    type_workbook,
+)
+from excel_compare_report import (
+    cell_detail_frames,
+    collect_report,
+    summary_display_cols,
+    write_baseline_matrix,
+    write_comparison_report,
+)
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+STATE_FILE = "_batch_state.jsonl"
+SUMMARY_FILE = "batch_summary.csv"
+MATRIX_FILE = "baseline_matrix"
+
+SUMMARY_FIELDS = [
+    "pair_id", "workbook_a", "workbook_b", "status", "sheets_compared",
+    "unmatched_sheets", "changed_cells", "seconds", "report", "error"
+]
+
+# =====================================================
+# PAIRING
+# =====================================================
+
+def file_id(path):
+    return re.sub(r"[^\w\-.]+", "_", os.path.splitext(os.path.basename(path))[0])
+
+
+def pair_id_for(path_a, path_b):
+    """
+    Readable file stems plus a short hash of both full paths, so same-named workbooks
+    from different directories (emea/Fin.xlsx, apac/Fin.xlsx) get distinct ids.
+    """
+    stem_a, stem_b = file_id(path_a), file_id(path_b)
+    raw = stem_a if stem_a == stem_b else f"{stem_a}__vs__{stem_b}"
+    paths = "\n".join(os.path.normcase(os.path.abspath(p)) for p in (path_a, path_b))
+    return f"{raw}_{hashlib.sha256(paths.encode('utf-8')).hexdigest()[:8]}"
+
+
+def pairs_from_dirs(dir_a, dir_b):
+    """Workbooks present in both directories (same file name), plus names found on one side only."""
+    def listing(d):
+        return {
+            name: os.path.join(d, name)
+            for name in sorted(os.listdir(d))
+            if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith("~$")
+        }
+    files_a, files_b = listing(dir_a), listing(dir_b)
+    pairs = [(files_a[n], files_b[n]) for n in files_a if n in files_b]
+    unpaired = sorted(set(files_a) ^ set(files_b))
+    return pairs, unpaired
+
+
+def pairs_from_manifest(manifest):
+    """Pairs from a CSV with workbook_a / workbook_b columns (relative paths resolve against the CSV)."""
+    base = os.path.dirname(os.path.abspath(manifest))
+    pairs = []
+    with open(manifest, newline="", encoding="utf-8") as f:
+        for rec in csv.DictReader(f):
+            a = os.path.join(base, rec["workbook_a"].strip())
+            b = os.path.join(base, rec["workbook_b"].strip())
+            pairs.append((a, b))
+    return pairs, []
+
+# =====================================================
+# RESUME STATE
+# =====================================================
+
+def options_digest(options):
+    """Short digest of the compare options a pair ran with."""
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_state(out_dir):
+    """Last recorded outcome per pair_id."""
+    state = {}
+    path = os.path.join(out_dir, STATE_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a hard stop
+                state[rec["pair_id"]] = rec
+    return state
+
+
+def append_state(out_dir, rec):
+    with open(os.path.join(out_dir, STATE_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_batch_summary(out_dir, state):
+    path = os.path.join(out_dir, SUMMARY_FILE)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for rec in state.values():
+            writer.writerow(rec)
+    return path
+
+# =====================================================
+# ONE WORKBOOK PAIR (runs in a worker process)
+# =====================================================
+
+def compare_workbook_pair(job):
+    """Compare two workbook files and write the report; returns the state record."""
+    start = time.perf_counter()
+    rec = {
+        "pair_id": job["pair_id"], "workbook_a": job["path_a"], "workbook_b": job["path_b"],
+        "options": job["options"], "status": "ok", "sheets_compared": 0, "unmatched_sheets": "", "changed_cells": 0,
+        "report": "", "error": ""
+    }
+    try:
+        cache = WorkbookCache(job["cache_dir"])
+        with open(job["path_a"], "rb") as f:
+            sheetsA, _, _ = load_workbook_cached(f.read(), cache)
+        with open(job["path_b"], "rb") as f:
+            sheetsB, _, _ = load_workbook_cached(f.read(), cache)
+        if job["typed"]:
+            sheetsA, sheetsB = type_workbook(sheetsA), type_workbook(sheetsB)
+
+        mapping = [(a, b, False) for a, b, _ in auto_map_sheets(sheetsA, sheetsB) if b is not None]
+        mapped = {a for a, _, _ in mapping}
+        rec["unmatched_sheets"] = ", ".join(str(a) for a in sheetsA if a not in mapped)
+
+        tasks, _ = build_pair_tasks(
+            sheetsA, sheetsB, mapping, key_cols=job["key_cols"], fingerprint=job["fingerprint"],
+            atol=job["atol"], rtol=job["rtol"]
+        )
+        results = compare_pairs(tasks)
+        summary_rows, diff_frames = collect_report(tasks, results, collapse_ranges=job["collapse_ranges"])
+        cell_frames = cell_detail_frames(summary_rows, results) if job["collapse_ranges"] else None
+
+        # write to a temp name first: an interrupted pair never looks finished
+        report = os.path.join(job["out_dir"], f"{job['pair_id']}.xlsx")
+        partial = report + ".partial"
+        companions = write_comparison_report(
+            partial, summary_rows, diff_frames,
+            summary_display_cols(job["key_cols"], job["fingerprint"], job["collapse_ranges"]),
+            base_name=job["pair_id"], spill_format=job["spill_format"], cell_frames=cell_frames
+        )
+        for name, data in companions.items():
+            with open(os.path.join(job["out_dir"], name), "wb") as f:
+                f.write(data)
+        os.replace(partial, report)
+
+        rec["report"] = report
+        rec["sheets_compared"] = len(tasks)
+        rec["changed_cells"] = int(sum(r["changed_cells"] for r in results))
+    except Exception as e:
+        rec["status"] = "error"
+        rec["error"] = f"{type(e).__name__}: {e}"
+    rec["seconds"] = round(time.perf_counter() - start, 3)
+    return rec
+
+# =====================================================
+# BATCH DRIVER
+# =====================================================
+
+def run_batch(pairs, out_dir, workers=1, key_cols=None, fingerprint=False, typed=False,
+              atol=0.0, rtol=0.0, spill_format="csv", collapse_ranges=False, cache_dir=DEFAULT_CACHE_DIR,
+              log=print):
+    """Compare all pairs not already finished in `out_dir`; returns the path of the batch summary."""
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+
+    options = {
+        "key_cols": list(key_cols or []), "fingerprint": fingerprint, "typed": typed,
+        "atol": atol, "rtol": rtol, "spill_format": spill_format, "collapse_ranges": collapse_ranges
+    }
+    digest = options_digest(options)
+
+    jobs = []
+    for path_a, path_b in pairs:
+        pair_id = pair_id_for(path_a, path_b)
+        done = state.get(pair_id)
+        if (done and done["status"] == "ok" and done.get("options") == digest
+                and os.path.exists(done["report"])):
+            continue
+        jobs.append({
+            "pair_id": pair_id, "path_a": path_a, "path_b": path_b, "out_dir": out_dir,
+            **options, "options": digest, "cache_dir": cache_dir
+        })
+
+    log(f"{len(pairs)} pair(s), {len(pairs) - len(jobs)} already done, {len(jobs)} to run")
+
+    def finish(rec, done):
+        state[rec["pair_id"]] = rec
+        append_state(out_dir, rec)
+        detail = rec["error"] if rec["status"] != "ok" else f"{rec['changed_cells']} changed cells"
+        log(f"[{done}/{len(jobs)}] {rec['pair_id']}: {rec['status']} ({detail}) in {rec['seconds']}s")
+
+    if workers <= 1:
+        for done, job in enumerate(jobs, start=1):
+            finish(compare_workbook_pair(job), done)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(compare_workbook_pair, job) for job in jobs]
+            for done, future in enumerate(as_completed(futures), start=1):
+                finish(future.result(), done)
+
+    return write_batch_summary(out_dir, state)
+
+
+def run_baseline(baseline_path, candidate_paths, out_dir, workers=1, key_cols=None, fingerprint=False,
+                 typed=False, atol=0.0, rtol=0.0, spill_format="csv", collapse_ranges=False,
+                 cache_dir=DEFAULT_CACHE_DIR, log=print):
+    """
+    Compare each candidate against the baseline; writes one report per candidate plus
+    baseline_matrix.xlsx / .csv. Returns the number of failed candidates.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    with open(baseline_path, "rb") as f:
+        sheets, _, _ = load_workbook_cached(f.read(), WorkbookCache(cache_dir))
+    baseline = index_baseline(sheets, typed=typed)
+
+    candidates = {}
+    for cid, path in zip(candidate_ids(candidate_paths), candidate_paths):
+        with open(path, "rb") as f:
+            candidates[cid] = f.read()
+    log(f"Baseline '{os.path.basename(baseline_path)}': {len(sheets)} sheet(s), {len(candidates)} candidate(s)")
+
+    def on_progress(done, total, rec):
+        detail = rec["error"] if rec["status"] != "ok" else f"{sum(rec['changed'].values())} changed cells"
+        log(f"[{done}/{total}] {rec['candidate']}: {rec['status']} ({detail}) in {rec['seconds']}s")
+
+    records = compare_baseline(
+        baseline, candidates, max_workers=workers, key_cols=key_cols, fingerprint=fingerprint,
+        atol=atol, rtol=rtol, collapse_ranges=collapse_ranges, spill_format=spill_format,
+        cache_dir=cache_dir, on_progress=on_progress
+    )
+
+    report_files = {}
+    for rec in records:
+        if rec["status"] != "ok":
+            continue
+        report_files[rec["candidate"]] = f"{rec['candidate']}_vs_baseline.xlsx"
+        for name, data in [(report_files[rec["candidate"]], rec["report"]), *rec["companions"].items()]:
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(data)
+
+    matrix = changed_cells_matrix(baseline, records)
+    matrix.to_csv(os.path.join(out_dir, f"{MATRIX_FILE}.csv"))
+    errors = {rec["candidate"]: rec["error"] for rec in records if rec["status"] != "ok"}
+    write_baseline_matrix(os.path.join(out_dir, f"{MATRIX_FILE}.xlsx"), matrix, report_files, errors)
+    log(f"Baseline matrix: {os.path.join(out_dir, MATRIX_FILE)}.xlsx")
+    return len(errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-compare Excel workbook pairs without the Streamlit UI.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir-a", help="Directory with the A (baseline) workbooks")
+    source.add_argument("--manifest", help="CSV with workbook_a,workbook_b columns")
+    source.add_argument("--baseline", help="One baseline workbook compared against every workbook in --dir-b")
+    parser.add_argument("--dir-b", help="Directory with the B workbooks (same file names as --dir-a)")
+    parser.add_argument("--out", required=True, help="Output directory for reports and batch_summary.csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Workbook pairs compared in parallel")
+    parser.add_argument("--align", choices=["position", "fingerprint", "key"], default="position")
+    parser.add_argument("--keys", default="", help="Comma-separated key columns (with --align key)")
+    parser.add_argument("--typed", action="store_true", help="Compare numeric columns as numbers")
+    parser.add_argument("--atol", type=float, default=0.0)
+    parser.add_argument("--rtol", type=float, default=0.0)
+    parser.add_argument("--spill-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--collapse-ranges", action="store_true",
+                        help="List changed ranges in drill-down sheets; per-cell detail goes to companion files")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    key_cols = [k.strip() for k in args.keys.split(",") if k.strip()] if args.align == "key" else []
+    if args.align == "key" and not key_cols:
+        parser.error("--keys is required with --align key")
+
+    if args.baseline:
+        if not args.dir_b:
+            parser.error("--dir-b is required with --baseline")
+        candidate_paths = [
+            os.path.join(args.dir_b, name) for name in sorted(os.listdir(args.dir_b))
+            if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith("~$")
+        ]
+        failed = run_baseline(
+            args.baseline, candidate_paths, args.out, workers=args.workers, key_cols=key_cols,
+            fingerprint=(args.align == "fingerprint"), typed=args.typed, atol=args.atol, rtol=args.rtol,
+            spill_format=args.spill_format, collapse_ranges=args.collapse_ranges, cache_dir=args.cache_dir
+        )
+        return 1 if failed else 0
+
+    if args.dir_a:
+        if not args.dir_b:
+            parser.error("--dir-b is required with --dir-a")
+        pairs, unpaired = pairs_from_dirs(args.dir_a, args.dir_b)
+    else:
+        pairs, unpaired = pairs_from_manifest(args.manifest)
+    for name in unpaired:
+        print(f"Skipping '{name}': present in only one directory", file=sys.stderr)
+
+    summary = run_batch(
+        pairs, args.out, workers=args.workers, key_cols=key_cols,
+        fingerprint=(args.align == "fingerprint"), typed=args.typed,
+        atol=args.atol, rtol=args.rtol, spill_format=args.spill_format,
+        collapse_ranges=args.collapse_ranges, cache_dir=args.cache_dir
+    )
+    failed = sum(1 for rec in load_state(args.out).values() if rec["status"] != "ok")
+    print(f"Batch summary: {summary}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
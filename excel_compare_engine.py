@@ -0,0 +1,1141 @@
+import hashlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter, range_boundaries
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+DIFF_COLUMNS = [
+    "Row Number",
+    "Column Number",
+    "Column Letter",
+    "Column Name",
+    "Workbook A Value",
+    "Workbook B Value"
+]
+
+HEADER_ROWS = 1  # header row occupies Excel row 1
+
+RANGE_COLUMNS = [
+    "Range",
+    "First Row",
+    "Last Row",
+    "Columns",
+    "Changed Cells",
+    "Sample A Value",
+    "Sample B Value"
+]
+
+# =====================================================
+# WORKBOOK PARSING
+# =====================================================
+
+def parse_workbook(source):
+    """All sheets of a workbook as string DataFrames, header on row 1, blank headers Unnamed_<n>."""
+    df_dict = pd.read_excel(source, sheet_name=None, dtype=str, header=0)
+    cleaned = {}
+    for sheet_name, df in df_dict.items():
+        df.columns = [
+            c if not str(c).startswith("Unnamed") else f"Unnamed_{i+1}"
+            for i, c in enumerate(df.columns)
+        ]
+        cleaned[sheet_name] = df
+    return cleaned
+
+# =====================================================
+# TYPED (NUMERIC) SHEETS
+# =====================================================
+
+def type_sheet(df):
+    """
+    Convert columns whose non-blank cells are all numeric to float64 (blanks -> NaN),
+    vectorized, once per sheet. Other columns stay as strings.
+    """
+    typed = df.copy()
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype.kind in "fiu":
+            continue
+        text = col.astype("string").str.strip()
+        text = text.where(text != "")
+        if text.isna().all():
+            continue
+        try:
+            numbers = text.astype(np.float64)
+        except (TypeError, ValueError):
+            # at least one non-numeric cell: keep as text
+            continue
+        typed.isetitem(i, numbers)
+    return typed
+
+
+def type_workbook(sheets):
+    return {name: type_sheet(df) for name, df in sheets.items()}
+
+
+def _is_numeric(values):
+    return values.dtype.kind in "fiu"
+
+
+def column_values(series):
+    """1-D values of a column: float for typed numeric columns, object otherwise."""
+    return series.to_numpy() if series.dtype.kind in "fiu" else series.to_numpy(dtype=object)
+
+
+def _as_float(values):
+    """(float array, blank mask); non-numeric text becomes NaN without being blank."""
+    if _is_numeric(values):
+        floats = values.astype(np.float64, copy=False)
+        return floats, np.isnan(floats)
+    text = pd.Series(values, dtype="string").str.strip()
+    blank = (text.isna() | (text == "")).to_numpy(dtype=bool)
+    return pd.to_numeric(text.where(~blank), errors="coerce").to_numpy(dtype=np.float64), blank
+
+
+def cells_differ(a, b, atol=0.0, rtol=0.0):
+    """
+    Element-wise change mask for two aligned 1-D columns.
+    Two text columns use string equality. Otherwise values compare numerically with
+    np.isclose(atol, rtol), blank == blank; leftover non-numeric text compares as text.
+    """
+    if not _is_numeric(a) and not _is_numeric(b):
+        return a != b
+    fa, blank_a = _as_float(a)
+    fb, blank_b = _as_float(b)
+    changed = ~(np.isclose(fa, fb, rtol=rtol, atol=atol) | (blank_a & blank_b))
+    text = (np.isnan(fa) & ~blank_a) | (np.isnan(fb) & ~blank_b)
+    if text.any():
+        changed[text] = a[text].astype(str) != b[text].astype(str)
+    return changed
+
+
+def _matchable(values):
+    """Object values with numeric text parsed to float (blank -> NaN) and other text kept."""
+    floats, blank = _as_float(values)
+    out = values.astype(object)
+    numeric = ~np.isnan(floats) | blank
+    out[numeric] = floats[numeric]
+    return out
+
+
+def matchable_columns(dfA, dfB, cols):
+    """
+    Copies of `cols` from both sheets with one dtype per column, for keys and row hashes.
+    Workbooks are typed independently, so a column can be float in A and text in B; such
+    columns are brought to a common form where 1.0 and "1" are the same value.
+    """
+    outA, outB = dfA[cols].copy(), dfB[cols].copy()
+    for i in range(len(cols)):
+        a, b = outA.iloc[:, i], outB.iloc[:, i]
+        if _is_numeric(a) != _is_numeric(b):
+            outA.isetitem(i, pd.Series(_matchable(column_values(a)), index=a.index, dtype=object))
+            outB.isetitem(i, pd.Series(_matchable(column_values(b)), index=b.index, dtype=object))
+    return outA, outB
+
+
+def blank_text(df):
+    """fillna("") on text columns only, so typed numeric columns keep their float dtype."""
+    text_cols = [i for i, dtype in enumerate(df.dtypes) if dtype.kind not in "fiu"]
+    if len(text_cols) == df.shape[1]:
+        return df.fillna("")
+    filled = df.copy()
+    for i in text_cols:
+        filled.isetitem(i, filled.iloc[:, i].fillna(""))
+    return filled
+
+
+def is_typed(df):
+    return any(dtype.kind in "fiu" for dtype in df.dtypes)
+
+# =====================================================
+# HELPERS
+# =====================================================
+
+def column_positions(columns, selected_cols):
+    """1-based Excel column numbers of `selected_cols` inside `columns`."""
+    positions = []
+    for j, col_name in enumerate(selected_cols):
+        try:
+            loc = columns.get_loc(col_name)
+        except KeyError:
+            loc = None
+        # duplicated headers give a slice / mask instead of an int
+        positions.append(loc + 1 if isinstance(loc, (int, np.integer)) else j + 1)
+    return np.asarray(positions, dtype=np.int64)
+
+
+def diff_frame(row_numbers, cols, cell_a, cell_b, common_cols, col_positions):
+    """
+    Per-cell diff table from already gathered values; cols index into common_cols,
+    and Excel letters are computed once per column.
+    """
+    cols = np.asarray(cols, dtype=np.int64)
+    letters = np.array([get_column_letter(p) for p in col_positions], dtype=object)
+    names = np.array(common_cols, dtype=object)
+
+    return pd.DataFrame({
+        "Row Number": row_numbers,
+        "Column Number": col_positions[cols],
+        "Column Letter": letters[cols],
+        "Column Name": names[cols],
+        "Workbook A Value": cell_a,
+        "Workbook B Value": cell_b
+    }, columns=DIFF_COLUMNS)
+
+
+def build_diff_frame(rows, cols, valuesA, valuesB, common_cols, col_positions, row_numbers=None):
+    """
+    Build the per-cell diff table column-wise from coordinate arrays into the
+    valuesA / valuesB blocks.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    if row_numbers is None:
+        row_numbers = rows + HEADER_ROWS + 1
+    return diff_frame(row_numbers, cols, valuesA[rows, cols], valuesB[rows, cols], common_cols, col_positions)
+
+# =====================================================
+# CHANGED RANGES
+# =====================================================
+
+def _range_ref(first_col, first_row, last_col, last_row):
+    start = f"{get_column_letter(first_col)}{first_row}"
+    if first_col == last_col and first_row == last_row:
+        return start
+    return f"{start}:{get_column_letter(last_col)}{last_row}"
+
+
+def collapse_diff_ranges(diff_df):
+    """
+    Coalesce the per-cell diff table into rectangular ranges: runs of consecutive changed
+    rows within a column, then side-by-side columns with the same run of rows.
+    One record per range (e.g. "C2:C90211") with its cell count and the first cell's values.
+    """
+    if diff_df is None or diff_df.empty:
+        return pd.DataFrame(columns=RANGE_COLUMNS)
+
+    rows = diff_df["Row Number"].to_numpy(dtype=np.int64)
+    cols = diff_df["Column Number"].to_numpy(dtype=np.int64)
+    order = np.lexsort((rows, cols))
+    r, c = rows[order], cols[order]
+
+    # Vertical runs: same column, consecutive rows
+    new_run = np.ones(len(r), dtype=bool)
+    new_run[1:] = (c[1:] != c[:-1]) | (r[1:] != r[:-1] + 1)
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(r)) - 1
+    run_col, run_first, run_last = c[starts], r[starts], r[ends]
+    run_cells = ends - starts + 1
+
+    # Rectangles: adjacent columns sharing the same first / last row
+    o2 = np.lexsort((run_col, run_last, run_first))
+    rc, rf, rl = run_col[o2], run_first[o2], run_last[o2]
+    new_rect = np.ones(len(rc), dtype=bool)
+    new_rect[1:] = (rf[1:] != rf[:-1]) | (rl[1:] != rl[:-1]) | (rc[1:] != rc[:-1] + 1)
+    rect_starts = np.flatnonzero(new_rect)
+    rect_ends = np.append(rect_starts[1:], len(rc)) - 1
+
+    first_col, last_col = rc[rect_starts], rc[rect_ends]
+    first_row, last_row = rf[rect_starts], rl[rect_starts]
+    cells = np.add.reduceat(run_cells[o2], rect_starts)
+    sample = order[starts[o2[rect_starts]]]
+
+    names = dict(zip(cols, diff_df["Column Name"].to_numpy(dtype=object)))
+    ranges = pd.DataFrame({
+        "Range": [_range_ref(*ref) for ref in zip(first_col, first_row, last_col, last_row)],
+        "First Row": first_row,
+        "Last Row": last_row,
+        "Columns": [
+            str(names[a]) if a == b else f"{names[a]} .. {names[b]}"
+            for a, b in zip(first_col, last_col)
+        ],
+        "Changed Cells": cells,
+        "Sample A Value": diff_df["Workbook A Value"].to_numpy(dtype=object)[sample],
+        "Sample B Value": diff_df["Workbook B Value"].to_numpy(dtype=object)[sample]
+    }, columns=RANGE_COLUMNS)
+
+    # Reading order: by first column, then first row
+    ranges = ranges.iloc[np.lexsort((first_row, first_col))]
+    return ranges.reset_index(drop=True)
+
+
+class CellDetailStore:
+    """
+    Sparse per-cell detail behind the collapsed ranges: the diff table sorted by
+    (column, row) so the cells of any A1 range are sliced out on demand.
+    """
+
+    def __init__(self, diff_df):
+        diff_df = diff_df if diff_df is not None else pd.DataFrame(columns=DIFF_COLUMNS)
+        rows = diff_df["Row Number"].to_numpy(dtype=np.int64)
+        cols = diff_df["Column Number"].to_numpy(dtype=np.int64)
+        order = np.lexsort((rows, cols))
+        self.frame = diff_df.iloc[order].reset_index(drop=True)
+        self.rows = rows[order]
+        self.cols = cols[order]
+
+    def __len__(self):
+        return len(self.frame)
+
+    def cells(self, range_ref):
+        """Changed cells inside an A1 range such as "C2:C90211" (or a single cell "C2")."""
+        min_col, min_row, max_col, max_row = range_boundaries(str(range_ref).replace("$", "").upper())
+        lo = np.searchsorted(self.cols, min_col, side="left")
+        hi = np.searchsorted(self.cols, max_col, side="right")
+        rows = self.rows[lo:hi]
+        inside = np.flatnonzero((rows >= min_row) & (rows <= max_row)) + lo
+        return self.frame.iloc[inside].reset_index(drop=True)
+
+# =====================================================
+# SHEET COMPARISON
+# =====================================================
+
+def compare_sheets(dfA, dfB, key_cols=None, fingerprint=False, atol=0.0, rtol=0.0):
+    """
+    Cell-level comparison of two sheets (header on row 1).
+    Rows are aligned by position, by `key_cols` when given (see compare_sheets_by_key),
+    or by row fingerprints when `fingerprint` is set (see compare_sheets_by_fingerprint).
+    Sheets typed with type_sheet compare numeric columns with atol / rtol.
+    Returns a dict with the diff table and the summary figures for the pair.
+    """
+    if key_cols:
+        return compare_sheets_by_key(dfA, dfB, key_cols, atol, rtol)
+    if fingerprint:
+        return compare_sheets_by_fingerprint(dfA, dfB, atol, rtol)
+
+    # Align column sets
+    common_cols = sorted(list(set(dfA.columns).intersection(set(dfB.columns))))
+    extra_cols_A = sorted(set(dfA.columns) - set(dfB.columns))
+    extra_cols_B = sorted(set(dfB.columns) - set(dfA.columns))
+
+    # Align row count
+    max_rows = max(len(dfA), len(dfB))
+    row_difference = len(dfA) - len(dfB)
+    dfA = blank_text(dfA.reset_index(drop=True).reindex(range(max_rows)))
+    dfB = blank_text(dfB.reset_index(drop=True).reindex(range(max_rows)))
+
+    if is_typed(dfA) or is_typed(dfB):
+        # typed sheets: column-wise numeric / text comparison
+        rows = np.arange(max_rows, dtype=np.int64)
+        diff_df, changed_rows = compare_matched_rows(dfA, dfB, rows, rows, common_cols, atol, rtol)
+        diff_df = diff_df.drop(columns=["Workbook B Row Number"])
+        changed_cells = len(changed_rows)
+    else:
+        valuesA = dfA[common_cols].to_numpy(dtype=object)
+        valuesB = dfB[common_cols].to_numpy(dtype=object)
+
+        # Compare cell values
+        rows, cols = np.nonzero(valuesA != valuesB)
+        changed_cells = len(rows)
+
+        diff_df = build_diff_frame(
+            rows, cols, valuesA, valuesB, common_cols,
+            column_positions(dfA.columns, common_cols)
+        )
+
+    return {
+        "diff_df": diff_df,
+        "common_cols": common_cols,
+        "extra_cols_A": extra_cols_A,
+        "extra_cols_B": extra_cols_B,
+        "row_difference": row_difference,
+        "changed_cells": changed_cells
+    }
+
+# =====================================================
+# KEY-BASED ROW ALIGNMENT
+# =====================================================
+
+def _combine_codes(codes, extra):
+    """Fold another non-negative code array into a composite code (hash factorize, no sort)."""
+    return pd.factorize(codes * (int(extra.max()) + 1 if len(extra) else 1) + extra, sort=False)[0]
+
+
+def _pair_in_order(codesA, codesB):
+    """
+    Pair equal codes between A and B, repeated codes in order of appearance.
+    Returns, for each position in A, the matched position in B or -1.
+    """
+    nA = len(codesA)
+    codes = pd.factorize(np.concatenate([codesA, codesB]), sort=False)[0].astype(np.int64)
+    occA = pd.Series(codes[:nA]).groupby(codes[:nA]).cumcount().to_numpy(dtype=np.int64)
+    occB = pd.Series(codes[nA:]).groupby(codes[nA:]).cumcount().to_numpy(dtype=np.int64)
+    rows = _combine_codes(codes, np.concatenate([occA, occB]))
+    return pd.Index(rows[nA:]).get_indexer(rows[:nA])
+
+
+def _key_codes(dfA, dfB, key_cols):
+    """Integer code per row of A + B for the combination of key column values."""
+    codes = np.zeros(len(dfA) + len(dfB), dtype=np.int64)
+    for col in key_cols:
+        values = np.concatenate([dfA[col].to_numpy(dtype=object), dfB[col].to_numpy(dtype=object)])
+        # blank keys get a code of their own: the -1 sentinel would break _combine_codes
+        codes = _combine_codes(codes, pd.factorize(values, sort=False, use_na_sentinel=False)[0].astype(np.int64))
+    return codes[:len(dfA)], codes[len(dfA):]
+
+
+def _key_labels(df, key_cols, rows):
+    """Readable key for each row, e.g. 'ID=42 | Region=EU'."""
+    if len(rows) == 0:
+        return np.array([], dtype=object)
+    parts = []
+    for col in key_cols:
+        values = df[col].iloc[rows]
+        text = values.astype(object).where(values.notna(), "").map(str)
+        parts.append(col + "=" + text.to_numpy(dtype=object))
+    labels = parts[0]
+    for part in parts[1:]:
+        labels = labels + " | " + part
+    return labels
+
+
+def compare_matched_rows(dfA, dfB, idxA, idxB, value_cols, atol=0.0, rtol=0.0):
+    """
+    Cell comparison of aligned row pairs (idxA[k] in A vs idxB[k] in B), column by column,
+    so no full positional mask is built. Typed numeric columns compare with atol / rtol.
+    Returns (diff_df, rows in A of each changed cell).
+    """
+    pair_parts, col_parts, a_parts, b_parts = [], [], [], []
+    for j, col in enumerate(value_cols):
+        a = column_values(dfA[col].take(idxA))
+        b = column_values(dfB[col].take(idxB))
+        changed = np.flatnonzero(cells_differ(a, b, atol, rtol))
+        pair_parts.append(changed)
+        col_parts.append(np.full(len(changed), j, dtype=np.int64))
+        a_parts.append(a[changed].astype(object))
+        b_parts.append(b[changed].astype(object))
+
+    empty = np.array([], dtype=np.int64)
+    pair_pos = np.concatenate(pair_parts) if pair_parts else empty
+    cols = np.concatenate(col_parts) if col_parts else empty
+    cell_a = np.concatenate(a_parts) if a_parts else empty.astype(object)
+    cell_b = np.concatenate(b_parts) if b_parts else empty.astype(object)
+
+    # Order by row in A, then column
+    order = np.lexsort((cols, idxA[pair_pos]))
+    pair_pos, cols = pair_pos[order], cols[order]
+    rowsA, rowsB = idxA[pair_pos], idxB[pair_pos]
+
+    diff_df = diff_frame(
+        rowsA + HEADER_ROWS + 1, cols, cell_a[order], cell_b[order],
+        value_cols, column_positions(dfA.columns, value_cols)
+    )
+    diff_df.insert(1, "Workbook B Row Number", rowsB + HEADER_ROWS + 1)
+    return diff_df, rowsA
+
+
+def _unmatched(n, matched_rows):
+    """Positions in range(n) not listed in `matched_rows`."""
+    seen = np.zeros(n, dtype=bool)
+    seen[matched_rows] = True
+    return np.flatnonzero(~seen)
+
+
+def _numbered_rows(df, rows):
+    """Whole rows of `df` with their Excel row number in front."""
+    out = df.iloc[rows].copy()
+    out.insert(0, "Row Number", np.asarray(rows, dtype=np.int64) + HEADER_ROWS + 1)
+    return out.reset_index(drop=True)
+
+
+def compare_sheets_by_key(dfA, dfB, key_cols, atol=0.0, rtol=0.0):
+    """
+    Align rows on `key_cols` with a hash join on factorized keys, then compare only matched rows.
+    Rows present only in A are reported as deleted, rows only in B as inserted.
+    Repeated keys are paired by order of appearance.
+    """
+    dfA = blank_text(dfA).reset_index(drop=True)
+    dfB = blank_text(dfB).reset_index(drop=True)
+    key_cols = list(key_cols)
+
+    missing = [k for k in key_cols if k not in dfA.columns or k not in dfB.columns]
+    if missing:
+        raise KeyError(f"Key columns missing from one of the sheets: {', '.join(missing)}")
+
+    common_cols = sorted(list(set(dfA.columns).intersection(set(dfB.columns))))
+    extra_cols_A = sorted(set(dfA.columns) - set(dfB.columns))
+    extra_cols_B = sorted(set(dfB.columns) - set(dfA.columns))
+    value_cols = [c for c in common_cols if c not in key_cols]
+
+    # Hash join on key + occurrence
+    match = _pair_in_order(*_key_codes(*matchable_columns(dfA, dfB, key_cols), key_cols))
+    matched = match >= 0
+    idxA = np.flatnonzero(matched)
+    idxB = match[matched].astype(np.int64)
+    deleted_rows = np.flatnonzero(~matched)
+    inserted_rows = _unmatched(len(dfB), idxB)
+
+    diff_df, rowsA = compare_matched_rows(dfA, dfB, idxA, idxB, value_cols, atol, rtol)
+    diff_df.insert(0, "Key", _key_labels(dfA, key_cols, rowsA))
+
+    return {
+        "diff_df": diff_df,
+        "inserted_df": _numbered_rows(dfB, inserted_rows),
+        "deleted_df": _numbered_rows(dfA, deleted_rows),
+        "common_cols": common_cols,
+        "extra_cols_A": extra_cols_A,
+        "extra_cols_B": extra_cols_B,
+        "row_difference": len(dfA) - len(dfB),
+        "changed_cells": len(rowsA),
+        "inserted_rows": len(inserted_rows),
+        "deleted_rows": len(deleted_rows),
+        "modified_rows": len(np.unique(rowsA))
+    }
+
+# =====================================================
+# ROW-FINGERPRINT ALIGNMENT (MOVES / INSERTS / DELETES)
+# =====================================================
+
+def row_fingerprints(df, cols):
+    """64-bit hash of each row over `cols`."""
+    if not cols:
+        return np.zeros(len(df), dtype=np.uint64)
+    # categorize=False: cell values are mostly distinct, factorizing first only costs time
+    return pd.util.hash_pandas_object(df[cols], index=False, categorize=False).to_numpy()
+
+
+POSITIONAL_MATCH_MIN = 0.5    # give up on the pre-check below this share of in-place rows
+
+
+def positional_matches(dfA, dfB, cols):
+    """
+    Row positions where A and B hold the same values on `cols` (blank == blank): the cheap
+    pre-check. Empty once fewer than POSITIONAL_MATCH_MIN of the rows still match, e.g. after
+    an insert near the top shifted everything, so such sheets pay for one column, not all.
+    """
+    n = min(len(dfA), len(dfB))
+    same = np.ones(n, dtype=bool)
+    for col in cols:
+        a = dfA[col].to_numpy()[:n]
+        b = dfB[col].to_numpy()[:n]
+        differ = np.asarray(a != b, dtype=bool) & same
+        if differ.any():
+            pos = np.flatnonzero(differ)
+            differ[pos] = ~(pd.isna(a[pos]) & pd.isna(b[pos]))
+            same &= ~differ
+            if same.sum() < POSITIONAL_MATCH_MIN * n:
+                return np.array([], dtype=np.int64)
+    return np.flatnonzero(same)
+
+
+def identical_rows(dfA, dfB, cols):
+    """
+    Identical rows, paired in order of appearance, as (A positions, B positions) sorted by A.
+    Rows already equal at the same position pair directly; only the rest are hashed, so an
+    in-place edited sheet costs about as much as the positional diff. Repeated rows may
+    therefore pair by position rather than strictly in order of appearance.
+    """
+    same = positional_matches(dfA, dfB, cols)
+    restA = _unmatched(len(dfA), same)
+    restB = _unmatched(len(dfB), same)
+    if not len(restA) or not len(restB):
+        return same, same
+    match = _pair_in_order(row_fingerprints(dfA.iloc[restA], cols), row_fingerprints(dfB.iloc[restB], cols))
+    hit = match >= 0
+    ia = np.concatenate([same, restA[hit]])
+    jb = np.concatenate([same, restB[match[hit].astype(np.int64)]])
+    order = np.argsort(ia, kind="stable")
+    return ia[order], jb[order]
+
+
+def _heaviest_increasing_blocks(b_starts, weights):
+    """
+    Blocks are runs of identical rows, listed in A order. Keep the chain of blocks whose
+    B positions increase and whose total length is largest (weighted LIS, Fenwick tree
+    over B ranks); the remaining blocks are rows that moved.
+    """
+    k = len(b_starts)
+    ranks = np.argsort(np.argsort(b_starts)).tolist()
+    weights = np.asarray(weights).tolist()
+    tree_val = [0] * (k + 1)
+    tree_idx = [-1] * (k + 1)
+    best = [0] * k
+    prev = [-1] * k
+    for i in range(k):
+        # best chain ending at a B rank below this block
+        x, v, j = ranks[i], 0, -1
+        while x > 0:
+            if tree_val[x] > v:
+                v, j = tree_val[x], tree_idx[x]
+            x -= x & -x
+        best[i] = v + weights[i]
+        prev[i] = j
+        x = ranks[i] + 1
+        while x <= k:
+            if best[i] > tree_val[x]:
+                tree_val[x], tree_idx[x] = best[i], i
+            x += x & -x
+
+    keep = np.zeros(k, dtype=bool)
+    i = int(np.argmax(best)) if k else -1
+    while i >= 0:
+        keep[i] = True
+        i = prev[i]
+    return keep
+
+
+def compare_sheets_by_fingerprint(dfA, dfB, atol=0.0, rtol=0.0):
+    """
+    Skip identical rows entirely: rows equal at the same position are matched directly,
+    the rest are hashed on the common columns and matched by fingerprint.
+    Identical rows that kept their relative order are unchanged, the others are moved;
+    the remaining rows are paired in order between unchanged anchors as modified
+    (full cell comparison only for these), leftovers are deleted / inserted.
+    Rows equal only within tolerance hash differently and end up as modified pairs
+    without changed cells.
+    """
+    dfA = blank_text(dfA).reset_index(drop=True)
+    dfB = blank_text(dfB).reset_index(drop=True)
+
+    common_cols = sorted(list(set(dfA.columns).intersection(set(dfB.columns))))
+    extra_cols_A = sorted(set(dfA.columns) - set(dfB.columns))
+    extra_cols_B = sorted(set(dfB.columns) - set(dfA.columns))
+
+    ia, jb = identical_rows(*matchable_columns(dfA, dfB, common_cols), common_cols)
+
+    # Runs of consecutive identical rows -> unchanged (in order) vs moved
+    breaks = np.flatnonzero((np.diff(ia) != 1) | (np.diff(jb) != 1)) + 1
+    starts = np.concatenate([[0], breaks]).astype(np.int64) if len(ia) else np.array([], dtype=np.int64)
+    lengths = np.diff(np.append(starts, len(ia)))
+    keep = _heaviest_increasing_blocks(jb[starts], lengths)
+    in_order = np.repeat(keep, lengths)
+    movedA, movedB = ia[~in_order], jb[~in_order]
+
+    # Remaining rows: pair in order within the gap between the same unchanged anchors
+    restA = _unmatched(len(dfA), ia)
+    restB = _unmatched(len(dfB), jb)
+    gapA = np.searchsorted(ia[starts[keep]], restA, side="right")
+    gapB = np.searchsorted(jb[starts[keep]], restB, side="right")
+    pair = _pair_in_order(gapA, gapB)
+    paired = pair[pair >= 0]
+    modA, modB = restA[pair >= 0], restB[paired]
+    deleted_rows = restA[pair < 0]
+    inserted_rows = restB[_unmatched(len(restB), paired)]
+
+    diff_df, rowsA = compare_matched_rows(dfA, dfB, modA, modB, common_cols, atol, rtol)
+
+    moved_df = pd.DataFrame({
+        "Row Number": movedA + HEADER_ROWS + 1,
+        "Workbook B Row Number": movedB + HEADER_ROWS + 1
+    })
+
+    return {
+        "diff_df": diff_df,
+        "inserted_df": _numbered_rows(dfB, inserted_rows),
+        "deleted_df": _numbered_rows(dfA, deleted_rows),
+        "moved_df": moved_df,
+        "common_cols": common_cols,
+        "extra_cols_A": extra_cols_A,
+        "extra_cols_B": extra_cols_B,
+        "row_difference": len(dfA) - len(dfB),
+        "changed_cells": len(rowsA),
+        "inserted_rows": len(inserted_rows),
+        "deleted_rows": len(deleted_rows),
+        "modified_rows": len(np.unique(rowsA)),
+        "moved_rows": len(movedA),
+        "unchanged_rows": int(in_order.sum())
+    }
+
+# =====================================================
+# SHEET AUTO-MAPPING (CONTENT SIGNATURES)
+# =====================================================
+
+SIGNATURE_ROWS = 200          # first-N rows hashed into the MinHash
+MINHASH_PERMUTATIONS = 64
+MAPPING_CUTOFF = 0.45
+NAME_ONLY_CUTOFF = 0.6        # as difflib.get_close_matches, for sheets compared by name only
+
+MAPPING_WEIGHTS = {
+    "headers": 0.4,
+    "rows": 0.3,
+    "size": 0.1,
+    "name": 0.2
+}
+
+_MERSENNE_61 = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240229)
+_MINHASH_A = _rng.integers(1, (1 << 61) - 1, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_MINHASH_B = _rng.integers(0, (1 << 61) - 1, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def _name_key(name):
+    return str(name).strip().lower()
+
+
+def _name_grams(name):
+    padded = f" {name} "
+    return frozenset(padded[k:k + 2] for k in range(len(padded) - 1))
+
+
+def _name_matrix(namesA, namesB):
+    """
+    Pairwise character similarity of (case-folded) sheet names: Dice coefficient of their
+    character bigrams, 2 * shared / total like difflib's ratio, for all pairs in one product.
+    """
+    gramsA = [_name_grams(n) for n in namesA]
+    gramsB = [_name_grams(n) for n in namesB]
+    vocab = {g: k for k, g in enumerate(set().union(*gramsA, *gramsB))}
+    mA = np.zeros((len(gramsA), len(vocab)), dtype=np.float32)
+    mB = np.zeros((len(gramsB), len(vocab)), dtype=np.float32)
+    for m, grams in ((mA, gramsA), (mB, gramsB)):
+        for i, items in enumerate(grams):
+            m[i, [vocab[g] for g in items]] = 1.0
+    total = mA.sum(axis=1)[:, None] + mB.sum(axis=1)[None, :]
+    return 2 * (mA @ mB.T) / total
+
+
+def _minhash(hashes):
+    """MinHash signature of a set of 64-bit hashes (universal hashing, one row per permutation)."""
+    if len(hashes) == 0:
+        return None
+    mixed = (np.outer(_MINHASH_A, hashes.astype(np.uint64)) + _MINHASH_B[:, None]) % _MERSENNE_61
+    return mixed.min(axis=1)
+
+
+def sheet_signature(name, df):
+    """
+    Cheap content signature of a sheet: header set, row-count bucket, MinHash of the
+    first SIGNATURE_ROWS row hashes, plus the case-folded name. `df` may be None (names only).
+    """
+    if df is None:
+        return {"name": _name_key(name), "headers": frozenset(), "size": None, "rows": None}
+    head = df.head(SIGNATURE_ROWS)
+    hashes = pd.util.hash_pandas_object(head, index=False, categorize=False).to_numpy() if head.shape[1] else np.array([])
+    return {
+        "name": _name_key(name),
+        "headers": frozenset(str(c) for c in df.columns),
+        "size": int(np.log2(len(df) + 1)),
+        "rows": _minhash(np.unique(hashes))
+    }
+
+
+def _jaccard_matrix(setsA, setsB):
+    """Pairwise Jaccard similarity of two lists of sets (two empty sets count as identical)."""
+    vocab = {tok: k for k, tok in enumerate(set().union(*setsA, *setsB))}
+    mA = np.zeros((len(setsA), len(vocab)), dtype=np.float32)
+    mB = np.zeros((len(setsB), len(vocab)), dtype=np.float32)
+    for m, sets in ((mA, setsA), (mB, setsB)):
+        for i, items in enumerate(sets):
+            m[i, [vocab[t] for t in items]] = 1.0
+    inter = mA @ mB.T
+    union = mA.sum(axis=1)[:, None] + mB.sum(axis=1)[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1), 1.0)
+
+
+def _signature_scores(sigsA, sigsB):
+    """
+    Similarity matrix (len(A) x len(B)) in [0, 1]: weighted feature agreement,
+    normalized by the weight of the features both sheets have (names only for
+    sheets that were not loaded).
+    """
+    w = MAPPING_WEIGHTS
+    scores = w["name"] * _name_matrix([a["name"] for a in sigsA], [b["name"] for b in sigsB])
+    weight = np.full_like(scores, w["name"])
+
+    # Headers and row-count bucket for loaded sheets
+    sizeA = np.array([np.nan if a["size"] is None else a["size"] for a in sigsA], dtype=float)
+    sizeB = np.array([np.nan if b["size"] is None else b["size"] for b in sigsB], dtype=float)
+    loaded = ~np.isnan(sizeA)[:, None] & ~np.isnan(sizeB)[None, :]
+    gap = np.abs(sizeA[:, None] - sizeB[None, :])
+    size_score = np.where(gap == 0, 1.0, np.where(gap == 1, 0.5, 0.0))
+    header_score = _jaccard_matrix([a["headers"] for a in sigsA], [b["headers"] for b in sigsB])
+    scores += np.where(loaded, w["headers"] * header_score + w["size"] * size_score, 0.0)
+    weight += np.where(loaded, w["headers"] + w["size"], 0.0)
+
+    # MinHash agreement for all pairs at once
+    rowsA = [k for k, a in enumerate(sigsA) if a["rows"] is not None]
+    rowsB = [k for k, b in enumerate(sigsB) if b["rows"] is not None]
+    if rowsA and rowsB:
+        mA = np.stack([sigsA[k]["rows"] for k in rowsA])
+        mB = np.stack([sigsB[k]["rows"] for k in rowsB])
+        agree = (mA[:, None, :] == mB[None, :, :]).mean(axis=2)
+        scores[np.ix_(rowsA, rowsB)] += w["rows"] * agree
+        weight[np.ix_(rowsA, rowsB)] += w["rows"]
+    return scores / weight
+
+
+def _assign(scores):
+    """Maximum-score one-to-one assignment; Hungarian via scipy when available, greedy otherwise."""
+    try:
+        from scipy.optimize import linear_sum_assignment
+        rows, cols = linear_sum_assignment(-scores)
+        return list(zip(rows.tolist(), cols.tolist()))
+    except ImportError:
+        pass
+    pairs = []
+    usedA, usedB = set(), set()
+    for flat in np.argsort(-scores, axis=None, kind="stable"):
+        i, j = divmod(int(flat), scores.shape[1])
+        if i in usedA or j in usedB:
+            continue
+        pairs.append((i, j))
+        usedA.add(i)
+        usedB.add(j)
+    return pairs
+
+
+def workbook_signatures(sheets):
+    """{sheet: signature} for a whole workbook, so a baseline is signed only once."""
+    return {name: sheet_signature(name, df) for name, df in sheets.items()}
+
+
+def auto_map_sheets(sheetsA, sheetsB, cutoff=MAPPING_CUTOFF, signaturesA=None):
+    """
+    Map each sheet of A to at most one sheet of B by content signature.
+    Sheets with the same name (ignoring case) are always paired, however much their content
+    changed; pairs compared by name only need NAME_ONLY_CUTOFF.
+    sheetsA / sheetsB: {name: DataFrame or None}; `signaturesA` may carry precomputed
+    signatures of A (see workbook_signatures). Returns [(sheetA, sheetB or None, score)]
+    in A order.
+    """
+    namesA, namesB = list(sheetsA), list(sheetsB)
+    mapping = {name: (None, 0.0) for name in namesA}
+    if namesA and namesB:
+        signaturesA = signaturesA or workbook_signatures(sheetsA)
+        sigsA = [signaturesA[n] for n in namesA]
+        sigsB = [sheet_signature(n, sheetsB[n]) for n in namesB]
+        scores = _signature_scores(sigsA, sigsB)
+
+        # Pin unambiguous exact name matches, assign the rest by score
+        keysA = [a["name"] for a in sigsA]
+        keysB = [b["name"] for b in sigsB]
+        pinned = [
+            (i, keysB.index(key)) for i, key in enumerate(keysA)
+            if keysA.count(key) == 1 and keysB.count(key) == 1
+        ]
+        restA = [i for i in range(len(namesA)) if i not in {p[0] for p in pinned}]
+        restB = [j for j in range(len(namesB)) if j not in {p[1] for p in pinned}]
+        if restA and restB:
+            for i, j in _assign(scores[np.ix_(restA, restB)]):
+                i, j = restA[i], restB[j]
+                names_only = sigsA[i]["size"] is None or sigsB[j]["size"] is None
+                if scores[i, j] >= (NAME_ONLY_CUTOFF if names_only else cutoff):
+                    pinned.append((i, j))
+        for i, j in pinned:
+            mapping[namesA[i]] = (namesB[j], float(scores[i, j]))
+    return [(name, *mapping[name]) for name in namesA]
+
+# =====================================================
+# STREAMING (CONSTANT-MEMORY) COMPARISON
+# =====================================================
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def open_streaming_workbook(source):
+    """Open an .xlsx/.xlsm (path or file-like) in openpyxl read-only mode."""
+    from openpyxl import load_workbook
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return load_workbook(source, read_only=True, data_only=True)
+
+
+def streaming_sheet_names(source):
+    """Sheet names of a workbook without parsing any sheet data."""
+    wb = open_streaming_workbook(source)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def _cell_text(value):
+    return "" if value is None else str(value)
+
+
+def _iter_sheet_rows(ws, width):
+    """
+    Yield data rows (after the header) as tuples of strings padded to `width`.
+    Blank rows are held back until a non-blank row follows, so trailing blank rows
+    are dropped the same way pandas.read_excel drops them.
+    """
+    pending_blank = 0
+    blank = ("",) * width
+    for values in ws.iter_rows(min_row=2, values_only=True):
+        if all(v is None for v in values):
+            pending_blank += 1
+            continue
+        for _ in range(pending_blank):
+            yield blank
+        pending_blank = 0
+        row = tuple(_cell_text(v) for v in values[:width])
+        yield row + ("",) * (width - len(row))
+
+
+def _sheet_header(ws):
+    """Header names from row 1, with blanks named Unnamed_<n> as in read_excel_sheets."""
+    header = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    width = max(len(header), ws.max_column or 0)
+    header = tuple(header) + (None,) * (width - len(header))
+    return [
+        c if c is not None and not str(c).startswith("Unnamed") else f"Unnamed_{i+1}"
+        for i, c in enumerate(header)
+    ]
+
+
+def iter_sheet_diffs(wsA, wsB, chunk_size=DEFAULT_CHUNK_SIZE, stats=None):
+    """
+    Read two read-only worksheets row by row in lockstep and yield diff DataFrames
+    chunk by chunk (positional alignment). Peak memory is bounded by `chunk_size`.
+    `stats`, when given, is filled with column / row-count information.
+    """
+    headerA, headerB = _sheet_header(wsA), _sheet_header(wsB)
+    common_cols = sorted(list(set(headerA).intersection(set(headerB))))
+    posA = np.array([headerA.index(c) for c in common_cols], dtype=np.int64)
+    posB = np.array([headerB.index(c) for c in common_cols], dtype=np.int64)
+    col_positions = posA + 1
+
+    rowsA_iter = _iter_sheet_rows(wsA, len(headerA))
+    rowsB_iter = _iter_sheet_rows(wsB, len(headerB))
+    blankA, blankB = ("",) * len(headerA), ("",) * len(headerB)
+    countA = countB = 0
+    offset = 0
+
+    while True:
+        chunkA = list(islice(rowsA_iter, chunk_size))
+        chunkB = list(islice(rowsB_iter, chunk_size))
+        if not chunkA and not chunkB:
+            break
+        countA += len(chunkA)
+        countB += len(chunkB)
+        n = max(len(chunkA), len(chunkB))
+        chunkA += [blankA] * (n - len(chunkA))
+        chunkB += [blankB] * (n - len(chunkB))
+
+        valuesA = np.array(chunkA, dtype=object).reshape(n, len(headerA))[:, posA]
+        valuesB = np.array(chunkB, dtype=object).reshape(n, len(headerB))[:, posB]
+        rows, cols = np.nonzero(valuesA != valuesB)
+        if len(rows):
+            yield build_diff_frame(
+                rows, cols, valuesA, valuesB, common_cols, col_positions,
+                row_numbers=rows + offset + HEADER_ROWS + 1
+            )
+        offset += n
+
+    if stats is not None:
+        stats.update({
+            "common_cols": common_cols,
+            "extra_cols_A": sorted(set(headerA) - set(headerB)),
+            "extra_cols_B": sorted(set(headerB) - set(headerA)),
+            "row_difference": countA - countB
+        })
+
+
+def compare_sheets_streaming(sourceA, sourceB, sheetA_name, sheetB_name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streaming counterpart of compare_sheets: never loads either sheet fully.
+    Only the differences themselves are kept in memory.
+    """
+    wbA = open_streaming_workbook(sourceA)
+    wbB = open_streaming_workbook(sourceB)
+    try:
+        stats = {}
+        chunks = list(iter_sheet_diffs(wbA[sheetA_name], wbB[sheetB_name], chunk_size, stats))
+    finally:
+        wbA.close()
+        wbB.close()
+
+    diff_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=DIFF_COLUMNS)
+    return {
+        "diff_df": diff_df,
+        "common_cols": stats["common_cols"],
+        "extra_cols_A": stats["extra_cols_A"],
+        "extra_cols_B": stats["extra_cols_B"],
+        "row_difference": stats["row_difference"],
+        "changed_cells": len(diff_df)
+    }
+
+# =====================================================
+# PARALLEL PER-SHEET COMPARISON
+# =====================================================
+
+def sheet_digest(df):
+    """
+    SHA-256 of a sheet's content: column names, dtypes and the 64-bit hash of every row.
+    Typed and text versions of the same sheet get different digests.
+    """
+    h = hashlib.sha256()
+    h.update(repr([str(c) for c in df.columns]).encode("utf-8"))
+    h.update(repr([str(t) for t in df.dtypes]).encode("utf-8"))
+    h.update(row_fingerprints(df, list(df.columns)).tobytes())
+    return h.hexdigest()
+
+
+def pair_result_key(digestA, digestB, key_cols=None, fingerprint=False, atol=0.0, rtol=0.0, streaming=False):
+    """Cache key of one pair's result: both sheet digests plus the comparison options."""
+    options = (list(key_cols or []), bool(fingerprint), float(atol), float(rtol), bool(streaming))
+    return hashlib.sha256(repr((digestA, digestB, options)).encode("utf-8")).hexdigest()
+
+def make_pair_task(sheetA_name, sheetB_name, dfA=None, dfB=None, key_cols=None, fingerprint=False,
+                   atol=0.0, rtol=0.0, sourceA=None, sourceB=None, chunk_size=DEFAULT_CHUNK_SIZE, cache_key=None):
+    """
+    Describe one sheet-pair comparison for run_pair_task.
+    In-memory pairs carry dfA/dfB; streaming pairs carry the workbook bytes in sourceA/sourceB
+    (compare_pairs hands those to each worker once rather than pickling them with every task).
+    `cache_key` (see pair_result_key) lets compare_pairs reuse an earlier result.
+    """
+    return {
+        "sheetA": sheetA_name,
+        "sheetB": sheetB_name,
+        "dfA": dfA,
+        "dfB": dfB,
+        "key_cols": list(key_cols or []),
+        "fingerprint": fingerprint,
+        "atol": atol,
+        "rtol": rtol,
+        "sourceA": sourceA,
+        "sourceB": sourceB,
+        "chunk_size": chunk_size,
+        "cache_key": cache_key
+    }
+
+
+def build_pair_tasks(sheetsA, sheetsB, mapping, key_cols=None, fingerprint=False, atol=0.0, rtol=0.0,
+                     sourceA=None, sourceB=None, chunk_size=DEFAULT_CHUNK_SIZE, digestsA=None, digestsB=None):
+    """
+    Tasks for the mapped sheet pairs, in mapping order.
+    mapping: iterable of (sheetA, sheetB, skip). With workbook bytes in sourceA / sourceB
+    the tasks are streaming comparisons. With per-sheet digests ({sheet: digest}) each task
+    gets a cache key. Returns (tasks, notes) where notes are
+    ("info" | "warning", message) for skipped pairs and key-column fallbacks.
+    """
+    tasks, notes = [], []
+    key_cols = list(key_cols or [])
+    for sheetA_name, sheetB_name, skip in mapping:
+        if skip:
+            notes.append(("info", f"⏭️ Skipping sheet '{sheetA_name}'"))
+            continue
+        if sheetB_name not in sheetsB:
+            notes.append(("warning", f"⚠️ Sheet '{sheetB_name}' not found in Workbook B — skipped"))
+            continue
+        if sourceA is not None:
+            cache_key = None
+            if digestsA is not None and digestsB is not None:
+                cache_key = pair_result_key(digestsA[sheetA_name], digestsB[sheetB_name], streaming=True)
+            tasks.append(make_pair_task(
+                sheetA_name, sheetB_name, sourceA=sourceA, sourceB=sourceB, chunk_size=chunk_size,
+                cache_key=cache_key
+            ))
+            continue
+
+        dfA_sheet = sheetsA[sheetA_name]
+        dfB_sheet = sheetsB[sheetB_name]
+        pair_keys = [k for k in key_cols if k in dfA_sheet.columns and k in dfB_sheet.columns]
+        if key_cols and len(pair_keys) != len(key_cols):
+            notes.append(("warning", f"⚠️ Key columns missing in '{sheetA_name}' / '{sheetB_name}' — aligned by position"))
+            pair_keys = []
+
+        cache_key = None
+        if digestsA is not None and digestsB is not None:
+            cache_key = pair_result_key(
+                digestsA[sheetA_name], digestsB[sheetB_name], pair_keys, fingerprint and not pair_keys, atol, rtol
+            )
+        tasks.append(make_pair_task(
+            sheetA_name, sheetB_name, dfA=dfA_sheet, dfB=dfB_sheet, key_cols=pair_keys,
+            fingerprint=fingerprint, atol=atol, rtol=rtol, cache_key=cache_key
+        ))
+    return tasks, notes
+
+
+_SOURCES = {}
+
+
+def _init_pair_worker(sources):
+    """Pool initializer: workbook bytes for streaming tasks reach each worker once, not once per pair."""
+    global _SOURCES
+    _SOURCES = sources
+
+
+def _detach_sources(task, sources):
+    """Copy of a streaming task whose workbook bytes are replaced by references into `sources`."""
+    if task["sourceA"] is None:
+        return task
+    refs = []
+    for side in ("sourceA", "sourceB"):
+        data = task[side]
+        ref = next((r for r, known in sources.items() if known is data), len(sources))
+        sources[ref] = data
+        refs.append(ref)
+    return dict(task, sourceA=refs[0], sourceB=refs[1])
+
+
+def _source_bytes(source):
+    return _SOURCES[source] if isinstance(source, int) else source
+
+
+def run_pair_task(task):
+    """Compare one sheet pair; the result dict gains an "elapsed" entry (seconds). Top-level so it pickles."""
+    start = time.perf_counter()
+    if task["sourceA"] is not None:
+        result = compare_sheets_streaming(
+            io.BytesIO(_source_bytes(task["sourceA"])), io.BytesIO(_source_bytes(task["sourceB"])),
+            task["sheetA"], task["sheetB"], chunk_size=task["chunk_size"]
+        )
+    else:
+        result = compare_sheets(
+            task["dfA"], task["dfB"], key_cols=task["key_cols"], fingerprint=task["fingerprint"],
+            atol=task["atol"], rtol=task["rtol"]
+        )
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def compare_pairs(tasks, max_workers=1, on_progress=None, result_cache=None):
+    """
+    Run sheet-pair tasks, in a process pool when max_workers > 1.
+    Results come back in task (mapping) order. `on_progress(done, total, task, elapsed)`
+    is called in the calling process as each pair finishes.
+
+    `result_cache` (any dict-like, e.g. Streamlit session state) maps task cache keys to
+    earlier results: those pairs are not recomputed (their result gets "cached": True),
+    and fresh results are stored back.
+    """
+    total = len(tasks)
+    results = [None] * total
+    done = 0
+
+    pending = []
+    for i, task in enumerate(tasks):
+        key = task.get("cache_key")
+        if result_cache is not None and key is not None and key in result_cache:
+            results[i] = dict(result_cache[key], cached=True)
+            done += 1
+            if on_progress:
+                on_progress(done, total, task, 0.0)
+        else:
+            pending.append(i)
+
+    def finish(i, result):
+        results[i] = result
+        key = tasks[i].get("cache_key")
+        if result_cache is not None and key is not None:
+            result_cache[key] = result
+
+    if max_workers <= 1 or len(pending) <= 1:
+        for i in pending:
+            finish(i, run_pair_task(tasks[i]))
+            done += 1
+            if on_progress:
+                on_progress(done, total, tasks[i], results[i]["elapsed"])
+        return results
+
+    # streaming tasks all point at the same one or two workbooks: ship those once per worker
+    sources = {}
+    shipped = {i: _detach_sources(tasks[i], sources) for i in pending}
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(pending)),
+                             initializer=_init_pair_worker, initargs=(sources,)) as pool:
+        futures = {pool.submit(run_pair_task, shipped[i]): i for i in pending}
+        for future in as_completed(futures):
+            i = futures[future]
+            finish(i, future.result())
+            done += 1
+            if on_progress:
+                on_progress(done, total, tasks[i], results[i]["elapsed"])
+    return results
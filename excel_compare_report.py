@@ -0,0 +1,285 @@
+import io
+
+import pandas as pd
+import xlsxwriter
+
+from excel_compare_engine import collapse_diff_ranges
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+EXCEL_MAX_ROWS = 1_048_576
+DETAIL_START_ROW = 2                                   # row 0: back link, row 2: header
+DETAIL_MAX_DATA_ROWS = EXCEL_MAX_ROWS - DETAIL_START_ROW - 1
+
+SUMMARY_SHEET = "Summary"
+HIGHLIGHT_COLOR = "#FFF59D"
+
+SUMMARY_DISPLAY_COLS = ["Sheet A", "Sheet B", "Extra Columns in A", "Extra Columns in B", "Row Difference", "Changed Cells"]
+KEY_DISPLAY_COLS = ["Inserted Rows", "Deleted Rows", "Modified Rows"]
+FINGERPRINT_DISPLAY_COLS = KEY_DISPLAY_COLS + ["Moved Rows"]
+RANGE_DISPLAY_COLS = ["Changed Ranges"]
+
+# =====================================================
+# SHEET NAMES
+# =====================================================
+
+def sanitize_sheet_name(name):
+    invalid = ['\\', '/', '*', '[', ']', ':', '?']
+    for ch in invalid:
+        name = name.replace(ch, "_")
+    name = name.strip()
+    if len(name) == 0:
+        name = "Sheet"
+    if len(name) > 28:
+        name = name[:28]
+    return name
+
+
+def unique_sheet_name(name, existing):
+    """Sanitized sheet name not already present in `existing`."""
+    safe = sanitize_sheet_name(name)
+    base = safe
+    idx = 1
+    while safe in existing:
+        safe = f"{base[:25]}_{idx}"
+        idx += 1
+    return safe
+
+# =====================================================
+# SUMMARY + DETAIL FRAMES
+# =====================================================
+
+def summary_display_cols(key_cols=None, fingerprint=False, collapse_ranges=False):
+    """Summary-sheet columns for the alignment mode used."""
+    cols = list(SUMMARY_DISPLAY_COLS) + (RANGE_DISPLAY_COLS if collapse_ranges else [])
+    if key_cols:
+        return cols + KEY_DISPLAY_COLS
+    if fingerprint:
+        return cols + FINGERPRINT_DISPLAY_COLS
+    return cols
+
+
+def collect_report(tasks, results, collapse_ranges=False):
+    """
+    Turn compared pairs (in mapping order) into (summary_rows, diff_frames):
+    one drill-down sheet per pair, plus inserted / deleted / moved row sheets
+    for key and fingerprint alignment. With `collapse_ranges` the drill-down sheet
+    lists changed ranges instead of cells (see cell_detail_frames for the cells).
+    """
+    summary_rows = []
+    diff_frames = {}
+    for task, result in zip(tasks, results):
+        sheetA_name = task["sheetA"]
+        sheetB_name = task["sheetB"]
+        extra_cols_A = result["extra_cols_A"]
+        extra_cols_B = result["extra_cols_B"]
+
+        sheet_name_safe = unique_sheet_name(f"{sheetA_name}_Diff", diff_frames)
+        ranges_df = collapse_diff_ranges(result["diff_df"]) if collapse_ranges else None
+        diff_frames[sheet_name_safe] = ranges_df if collapse_ranges else result["diff_df"]
+
+        for suffix, frame_key in (("_Ins", "inserted_df"), ("_Del", "deleted_df"), ("_Mov", "moved_df")):
+            if frame_key in result:
+                diff_frames[unique_sheet_name(f"{sheetA_name}{suffix}", diff_frames)] = result[frame_key]
+
+        summary_rows.append({
+            "Sheet A": sheetA_name,
+            "Sheet B": sheetB_name,
+            "Extra Columns in A": ", ".join(sorted(map(str, extra_cols_A))) if extra_cols_A else "None",
+            "Extra Columns in B": ", ".join(sorted(map(str, extra_cols_B))) if extra_cols_B else "None",
+            "Row Difference": result["row_difference"],
+            "Changed Cells": result["changed_cells"],
+            "Changed Ranges": len(ranges_df) if collapse_ranges else "",
+            "Inserted Rows": result.get("inserted_rows", ""),
+            "Deleted Rows": result.get("deleted_rows", ""),
+            "Modified Rows": result.get("modified_rows", ""),
+            "Moved Rows": result.get("moved_rows", ""),
+            "Compare Time (s)": round(result.get("elapsed", 0.0), 3),
+            "Drilldown Sheet": sheet_name_safe
+        })
+    return summary_rows, diff_frames
+
+
+def cell_detail_frames(summary_rows, results):
+    """Per-cell diff tables keyed by drill-down sheet, for range-collapsed reports."""
+    return {
+        rec["Drilldown Sheet"]: result["diff_df"]
+        for rec, result in zip(summary_rows, results)
+        if result["diff_df"] is not None and not result["diff_df"].empty
+    }
+
+# =====================================================
+# SPILL FILES (detail sheets above Excel's row limit)
+# =====================================================
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def spill_file_name(base_name, sheet_name, spill_format, suffix=""):
+    return f"{base_name}_{sheet_name}{suffix}.{spill_format}"
+
+
+def _parquet_ready(df):
+    """
+    Native dtypes stay as they are; only object columns mixing value types (which Parquet
+    cannot store) are stringified, and their nulls stay null.
+    """
+    out = df
+    for pos in range(df.shape[1]):
+        values = df.iloc[:, pos]
+        if values.dtype != object or len({type(v) for v in values.dropna()}) < 2:
+            continue
+        if out is df:
+            out = df.copy()
+        out.isetitem(pos, values.map(lambda v: v if pd.isna(v) else str(v)).astype(object))
+    return out
+
+
+def spill_frame(df, spill_format):
+    """Serialize a detail frame for a companion file."""
+    if spill_format == "parquet":
+        buffer = io.BytesIO()
+        _parquet_ready(df).to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    return df.to_csv(index=False).encode("utf-8")
+
+# =====================================================
+# REPORT WRITER
+# =====================================================
+
+def _cell(value):
+    return "" if value is None or (isinstance(value, float) and value != value) else value
+
+
+def write_comparison_report(output, summary_rows, diff_frames, display_cols,
+                            base_name="report", spill_format="csv", max_rows=DETAIL_MAX_DATA_ROWS,
+                            cell_frames=None):
+    """
+    Write the highlighted comparison workbook (Summary first, then detail sheets) to `output`
+    with xlsxwriter in constant_memory mode. Rows are written strictly in order and each
+    detail sheet is highlighted with a single conditional-format rule.
+
+    Detail frames longer than `max_rows` are spilled to companion CSV / Parquet files,
+    linked from the Summary sheet. `cell_frames` ({detail sheet: per-cell diff}) go to
+    companion files linked from the top of their (range-collapsed) detail sheet.
+    Returns {file_name: bytes} for the companion files.
+    """
+    if spill_format == "parquet" and not _parquet_available():
+        spill_format = "csv"
+
+    spills = {
+        sheet: spill_file_name(base_name, sheet, spill_format)
+        for sheet, df in diff_frames.items()
+        if df is not None and len(df) > max_rows
+    }
+    companions = {}
+    cell_files = {}
+    for sheet, df in (cell_frames or {}).items():
+        cell_files[sheet] = spill_file_name(base_name, sheet, spill_format, suffix="_cells")
+        companions[cell_files[sheet]] = spill_frame(df, spill_format)
+
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "in_memory": False})
+    link_fmt = workbook.add_format({'font_color': 'blue', 'underline': 1})
+    header_fmt = workbook.add_format({"bold": True, "border": 1})
+    highlight_fmt = workbook.add_format({"bg_color": HIGHLIGHT_COLOR, "font_color": "#000000"})
+
+    # --- Summary (Drilldown link in column A, data from column B) ---
+    summary_cols = list(display_cols) + (["Detail File"] if spills else [])
+    ws_summary = workbook.add_worksheet(SUMMARY_SHEET)
+    ws_summary.set_column(0, 0, 18)
+    ws_summary.set_column(1, len(summary_cols), 25)
+    ws_summary.write(0, 0, "Drilldown")
+    ws_summary.write_row(0, 1, summary_cols, header_fmt)
+    for r, rec in enumerate(summary_rows, start=1):
+        drill_sheet = rec["Drilldown Sheet"]
+        ws_summary.write_formula(r, 0, f'=HYPERLINK("#\'{drill_sheet}\'!A1","Go to Diff")', link_fmt)
+        ws_summary.write_row(r, 1, [_cell(rec.get(c, "")) for c in display_cols])
+        if drill_sheet in spills:
+            ws_summary.write_url(r, len(summary_cols), f"external:{spills[drill_sheet]}", link_fmt, "Open Detail File")
+
+    # --- Detail sheets ---
+    back_link = f'=HYPERLINK("#{SUMMARY_SHEET}!A1","Back to Summary")'
+    for sheet_name_safe, diff_df in diff_frames.items():
+        worksheet = workbook.add_worksheet(sheet_name_safe)
+
+        if diff_df is None or diff_df.empty:
+            worksheet.write(0, 0, "Status", header_fmt)
+            worksheet.write(1, 0, "No Differences Found")
+            continue
+
+        worksheet.write_formula(0, 0, back_link, link_fmt)
+        worksheet.set_column(0, diff_df.shape[1] - 1, 20)
+        if sheet_name_safe in cell_files:
+            worksheet.write_url(0, 1, f"external:{cell_files[sheet_name_safe]}", link_fmt, "Per-cell detail")
+
+        if sheet_name_safe in spills:
+            file_name = spills[sheet_name_safe]
+            companions[file_name] = spill_frame(diff_df, spill_format)
+            worksheet.write(1, 0, f"{len(diff_df):,} rows exceed Excel's row limit — full detail in:")
+            worksheet.write_url(2, 0, f"external:{file_name}", link_fmt, file_name)
+            continue
+
+        worksheet.write_row(DETAIL_START_ROW, 0, [str(c) for c in diff_df.columns], header_fmt)
+        first = DETAIL_START_ROW + 1
+        for r, values in enumerate(diff_df.itertuples(index=False, name=None), start=first):
+            worksheet.write_row(r, 0, [_cell(v) for v in values])
+
+        # One highlight rule for the whole data block
+        worksheet.conditional_format(
+            first, 0, first + len(diff_df) - 1, diff_df.shape[1] - 1,
+            {"type": "formula", "criteria": "=TRUE", "format": highlight_fmt}
+        )
+
+    workbook.close()
+    return companions
+
+# =====================================================
+# BASELINE MATRIX
+# =====================================================
+
+MATRIX_SHEET = "Matrix"
+
+
+def write_baseline_matrix(output, matrix, report_files=None, errors=None):
+    """
+    Write the baseline-sheet x candidate matrix of changed cells to `output`. Candidate
+    headers link to their report file when `report_files` ({candidate: file name}) is given;
+    `errors` ({candidate: message}) are listed under the matrix. Non-zero counts are highlighted.
+    """
+    report_files = report_files or {}
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "in_memory": False})
+    link_fmt = workbook.add_format({'font_color': 'blue', 'underline': 1, "bold": True, "border": 1})
+    header_fmt = workbook.add_format({"bold": True, "border": 1})
+    highlight_fmt = workbook.add_format({"bg_color": HIGHLIGHT_COLOR, "font_color": "#000000"})
+
+    ws = workbook.add_worksheet(MATRIX_SHEET)
+    ws.set_column(0, 0, 30)
+    ws.set_column(1, max(len(matrix.columns), 1), 18)
+    ws.write(0, 0, matrix.index.name or "Sheet", header_fmt)
+    for c, candidate in enumerate(matrix.columns, start=1):
+        if candidate in report_files:
+            ws.write_url(0, c, f"external:{report_files[candidate]}", link_fmt, str(candidate))
+        else:
+            ws.write(0, c, str(candidate), header_fmt)
+
+    for r, (sheet, values) in enumerate(zip(matrix.index, matrix.itertuples(index=False, name=None)), start=1):
+        ws.write(r, 0, str(sheet))
+        ws.write_row(r, 1, ["" if pd.isna(v) else int(v) for v in values])  # blank: no matching sheet
+
+    if len(matrix) and len(matrix.columns):
+        ws.conditional_format(1, 1, len(matrix), len(matrix.columns),
+                              {"type": "cell", "criteria": ">", "value": 0, "format": highlight_fmt})
+
+    row = len(matrix) + 2
+    for candidate, message in (errors or {}).items():
+        ws.write_row(row, 0, [f"{candidate}: failed", message])
+        row += 1
+
+    workbook.close()
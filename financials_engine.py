@@ -0,0 +1,398 @@
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+HEADER_LEVELS = ["Category", "Subcategory", "Year"]   # first 3 rows of the sheet
+DIMENSIONS = ["Section"] + HEADER_LEVELS
+SECTION_COL = ("Section", "", "")
+SHEET_COL = "Sheet"
+VALUE_COL = "Value"
+TEXT_COL = "Value Text"                                # original text where Value does not parse
+ALL_SHEETS = "*"                                       # never a valid sheet name
+
+DEFAULT_EXPORT_DIR = os.environ.get(
+    "FINANCIALS_EXPORT_DIR",
+    os.path.join(tempfile.gettempdir(), "financials_exports")
+)
+DEFAULT_EXPORT_MAX_BYTES = int(os.environ.get("FINANCIALS_EXPORT_MAX_BYTES", 2 * 1024 ** 3))
+EXPORT_CHUNK_ROWS = 100_000
+EXCEL_MAX_ROWS = 1_048_576
+EXPORT_SHEET = "Flattened_Data"
+EXPORT_LAYOUT = 2                                      # bump when the exported columns change
+
+EXPORT_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
+# =====================================================
+# FLATTENING
+# =====================================================
+
+def flatten_sheet(raw):
+    """
+    Sheet read with header=None -> (wide frame with 3-level column MultiIndex, long frame).
+    The first column holds the Section; every other column becomes Category / Subcategory / Year.
+    """
+    if raw.shape[0] < 3 or raw.shape[1] < 2:
+        raise ValueError("expected 3 header rows and a Section column plus data columns")
+    header_rows = raw.iloc[0:3, :]  # first 3 rows = headers
+    data_rows = raw.iloc[3:, :].reset_index(drop=True)
+
+    # Build MultiIndex columns
+    multi_cols = pd.MultiIndex.from_arrays(header_rows.values, names=HEADER_LEVELS)
+    df = pd.DataFrame(data_rows.values, columns=multi_cols)
+    # set the first label directly: blank header cells read as NaN never match in rename()
+    df.columns = pd.MultiIndex.from_tuples([SECTION_COL] + list(df.columns[1:]), names=HEADER_LEVELS)
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    # Flatten to long format
+    melted = df.melt(
+        id_vars=[SECTION_COL],
+        var_name=HEADER_LEVELS,
+        value_name="Value"
+    )
+    melted.rename(columns={SECTION_COL: "Section"}, inplace=True)
+
+    # Clean nulls
+    for col in DIMENSIONS:
+        melted[col] = melted[col].fillna("").astype(str).str.strip()
+    return df, melted
+
+def _flatten_named(item):
+    """(sheet, raw) -> (sheet, long frame with categorical dimensions, error)."""
+    name, raw = item
+    try:
+        _, melted = flatten_sheet(raw)
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}"
+    for col in DIMENSIONS:
+        melted[col] = melted[col].astype("category")
+    return name, melted, ""
+
+
+def _concat_categorical(frames, cols):
+    """Concatenate frames keeping `cols` categorical (union of the categories)."""
+    out = pd.concat(frames, ignore_index=True)
+    for col in cols:
+        out[col] = pd.api.types.union_categoricals([f[col] for f in frames], sort_categories=True)
+    return out
+
+
+def flatten_workbook(data, max_workers=1):
+    """
+    Flatten every sheet of a workbook (bytes) into one long table: Sheet, Section, Category,
+    Subcategory, Year (all categorical) and Value. The workbook is opened and parsed once,
+    here; with max_workers > 1 worker processes only flatten the parsed sheets in parallel
+    (only the compact categorical result travels back).
+    Returns (long frame, [(sheet, error)] for sheets that do not fit the 3-row header layout).
+    """
+    with pd.ExcelFile(io.BytesIO(data)) as xls:
+        raws = [(sheet, xls.parse(sheet, header=None)) for sheet in xls.sheet_names]
+    if max_workers > 1 and len(raws) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(raws))) as pool:
+            flattened = list(pool.map(_flatten_named, raws))
+    else:
+        flattened = [_flatten_named(item) for item in raws]
+
+    frames, skipped = [], []
+    for name, melted, error in flattened:
+        if melted is None:
+            skipped.append((name, error))
+            continue
+        melted.insert(0, SHEET_COL, pd.Categorical([name] * len(melted)))
+        frames.append(melted)
+
+    if not frames:
+        empty = pd.DataFrame({col: pd.Categorical([]) for col in [SHEET_COL] + DIMENSIONS})
+        empty["Value"] = pd.Series(dtype=object)
+        return empty, skipped
+    return _concat_categorical(frames, [SHEET_COL] + DIMENSIONS), skipped
+
+# =====================================================
+# TYPED LONG STORE
+# =====================================================
+
+def _sorted_categorical(series):
+    """Categorical with sorted categories (reused as-is when the column already is one)."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.is_monotonic_increasing:
+        return series.array
+    return pd.Categorical(series.to_numpy(dtype=object))
+
+
+class FinancialsStore:
+    """
+    Compact long-format financials: categorical dimensions, float64 Value, and the original
+    text only for the (few) cells whose value does not parse as a number. Rows can be
+    selected by any dimension through per-dimension group indexes built on first use.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.dims = [c for c in frame.columns if c not in (VALUE_COL, TEXT_COL)]
+        self._groups = {}
+
+    @classmethod
+    def from_long(cls, melted):
+        """Build from a long frame (dimension columns + mixed-object Value)."""
+        raw = melted[VALUE_COL]
+        value = pd.to_numeric(raw, errors="coerce").astype(np.float64)
+        unparsed = value.isna().to_numpy() & raw.notna().to_numpy()
+
+        frame = pd.DataFrame({
+            dim: _sorted_categorical(melted[dim]) for dim in melted.columns if dim != VALUE_COL
+        })
+        frame[VALUE_COL] = value.to_numpy()
+        text = np.full(len(frame), None, dtype=object)
+        text[unparsed] = raw.to_numpy(dtype=object)[unparsed].astype(str)
+        frame[TEXT_COL] = pd.Categorical(text)
+        return cls(frame)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def memory_usage(self):
+        return int(self.frame.memory_usage(deep=True).sum())
+
+    def value_at(self, row):
+        """Original value of one row: the text when it did not parse, else the float."""
+        text = self.frame[TEXT_COL].array[row]
+        return text if isinstance(text, str) else self.frame[VALUE_COL].array[row]
+
+    def _group_index(self, dim):
+        """(row positions sorted by code, start offset per code) for one dimension."""
+        if dim not in self._groups:
+            codes = self.frame[dim].array.codes
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(self.frame[dim].cat.categories) + 1))
+            self._groups[dim] = (order, bounds)
+        return self._groups[dim]
+
+    def rows(self, **criteria):
+        """Sorted row positions matching every criterion (dimension=label or list of labels)."""
+        result = None
+        for dim, labels in criteria.items():
+            if dim not in self.dims:
+                raise KeyError(dim)
+            labels = labels if isinstance(labels, (list, tuple, set)) else [labels]
+            order, bounds = self._group_index(dim)
+            categories = self.frame[dim].cat.categories
+            codes = [categories.get_loc(label) for label in labels if label in categories]
+            rows = np.sort(np.concatenate([order[bounds[c]:bounds[c + 1]] for c in codes])) if codes else np.array([], dtype=np.int64)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return np.arange(len(self.frame)) if result is None else result
+
+    def select(self, **criteria):
+        """Sub-store of the rows matching `criteria` (categories are kept)."""
+        return FinancialsStore(self.frame.take(self.rows(**criteria)).reset_index(drop=True))
+
+# =====================================================
+# HIERARCHY INDEX
+# =====================================================
+
+class HierarchyIndex:
+    """
+    Section -> Category -> Subcategory -> Year lookup over a long frame, built once.
+    Rows are sorted by the categorical codes of the levels (categories in sorted order),
+    so every prefix is one contiguous block found by binary search: child options and
+    values cost O(log n) plus the size of that block, never a scan of the frame.
+    """
+
+    def __init__(self, melted, levels=DIMENSIONS, value_col=VALUE_COL):
+        """`melted`: long frame, or a FinancialsStore (values then come from the store)."""
+        self.levels = list(levels)
+        self.store = melted if isinstance(melted, FinancialsStore) else None
+        frame = self.store.frame if self.store is not None else melted
+        cats = [_sorted_categorical(frame[level]) for level in self.levels]
+        self.categories = [np.asarray(c.categories, dtype=object) for c in cats]
+        self.lookup = [{label: code for code, label in enumerate(c)} for c in self.categories]
+
+        # stable lexsort: first row of a block is the first match in the original order
+        order = np.lexsort([c.codes for c in reversed(cats)])
+        self.codes = [c.codes[order] for c in cats]
+        self.rows = order
+        self.values = None if self.store is not None else frame[value_col].to_numpy(dtype=object)[order]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _block(self, prefix):
+        """[lo, hi) of the rows under `prefix` (labels of the leading levels)."""
+        lo, hi = 0, len(self.rows)
+        for level, label in enumerate(prefix):
+            code = self.lookup[level].get(label)
+            if code is None:
+                return 0, 0
+            col = self.codes[level][lo:hi]
+            lo, hi = lo + np.searchsorted(col, code, side="left"), lo + np.searchsorted(col, code, side="right")
+        return lo, hi
+
+    def options(self, *prefix):
+        """Sorted labels of the next level under `prefix` (top level when empty)."""
+        level = len(prefix)
+        if level == 0:
+            return list(self.categories[0][np.unique(self.codes[0])])
+        lo, hi = self._block(prefix)
+        codes = self.codes[level][lo:hi]
+        if not len(codes):
+            return []
+        firsts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        return list(self.categories[level][codes[firsts]])
+
+    def value(self, *path):
+        """Value at a full path (first match); KeyError when the path does not exist."""
+        lo, hi = self._block(path)
+        if hi == lo:
+            raise KeyError(path)
+        return self.store.value_at(self.rows[lo]) if self.store is not None else self.values[lo]
+
+# =====================================================
+# EXPORTS (generated on demand, cached on disk by content hash)
+# =====================================================
+
+def sheet_digest(data, sheet):
+    """SHA-256 of the workbook bytes plus the sheet name: identifies one sheet's content."""
+    h = hashlib.sha256(data)
+    h.update(str(sheet).encode("utf-8"))
+    return h.hexdigest()
+
+
+def export_formats():
+    return ["xlsx", "csv", "parquet"] if pq is not None else ["xlsx", "csv"]
+
+
+def export_path(digest, fmt, export_dir=DEFAULT_EXPORT_DIR):
+    return os.path.join(export_dir, f"{digest}_v{EXPORT_LAYOUT}.{fmt}")
+
+
+def cached_export(digest, fmt, export_dir=DEFAULT_EXPORT_DIR):
+    """Path of an already generated export (marked as recently used), or None."""
+    path = export_path(digest, fmt, export_dir)
+    try:
+        os.utime(path, None)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def evict_exports(export_dir=DEFAULT_EXPORT_DIR, max_bytes=DEFAULT_EXPORT_MAX_BYTES, keep=None):
+    """Drop least recently used exports (never `keep`) until the directory fits in `max_bytes`."""
+    entries = []
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        if name.endswith(".partial") or path == keep:
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # removed by a concurrent eviction
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield start, df.iloc[start:start + chunk_rows]
+
+
+def _cell(value):
+    return "" if value is None or (isinstance(value, float) and value != value) else value
+
+
+def _write_csv(df, path, chunk_rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if df.empty:
+            df.to_csv(f, index=False)
+        for start, chunk in _chunks(df, chunk_rows):
+            chunk.to_csv(f, index=False, header=(start == 0))
+
+
+def _write_xlsx(df, path, chunk_rows):
+    """Row-streamed (constant_memory); rows past Excel's limit continue on _2, _3, ... sheets."""
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+    header = [str(c) for c in df.columns]
+    per_sheet = EXCEL_MAX_ROWS - 1
+    ws, r = None, 0
+    for _, chunk in _chunks(df, chunk_rows):
+        for values in chunk.itertuples(index=False, name=None):
+            if ws is None or r > per_sheet:
+                ws = workbook.add_worksheet(EXPORT_SHEET if ws is None else f"{EXPORT_SHEET}_{len(workbook.worksheets()) + 1}")
+                ws.write_row(0, 0, header)
+                r = 1
+            ws.write_row(r, 0, [_cell(v) for v in values])
+            r += 1
+    if ws is None:
+        workbook.add_worksheet(EXPORT_SHEET).write_row(0, 0, header)
+    workbook.close()
+
+
+def _parquet_column(col):
+    """Numbers stay numeric; mixed object columns become strings (nulls kept)."""
+    if col.dtype != object:
+        return col
+    try:
+        return pd.to_numeric(col)
+    except (ValueError, TypeError):
+        return col.where(col.isna(), col.astype(str))
+
+
+def _write_parquet(df, path, chunk_rows):
+    table = pa.Table.from_pandas(
+        pd.DataFrame({str(c): _parquet_column(df[c]) for c in df.columns}), preserve_index=False
+    )
+    with pq.ParquetWriter(path, table.schema, compression="zstd") as writer:
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            writer.write_batch(batch)
+
+
+def write_export(df, digest, fmt, export_dir=DEFAULT_EXPORT_DIR, chunk_rows=EXPORT_CHUNK_ROWS,
+                 max_bytes=DEFAULT_EXPORT_MAX_BYTES):
+    """
+    Export path for `df` in `fmt`, generating it only when not cached yet.
+    Written in chunks to a unique temp name first (sessions are threads of one process), so
+    a half-written file is never served; the least recently used exports go above `max_bytes`.
+    """
+    path = cached_export(digest, fmt, export_dir)
+    if path:
+        return path
+    if fmt == "parquet" and pq is None:
+        raise ValueError("Parquet export needs pyarrow")
+
+    os.makedirs(export_dir, exist_ok=True)
+    path = export_path(digest, fmt, export_dir)
+    fd, partial = tempfile.mkstemp(suffix=".partial", dir=export_dir)
+    os.close(fd)
+    writer = {"xlsx": _write_xlsx, "csv": _write_csv, "parquet": _write_parquet}[fmt]
+    try:
+        writer(df, partial, chunk_rows)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    evict_exports(export_dir, max_bytes, keep=path)
+    return path
@@ -0,0 +1,697 @@
+"""
+Header-band detection and table building for finlense, free of Streamlit so the
+extraction logic can be imported (and tested) without the UI: workbook sessions,
+learned layouts, cell cleaning and the auto-detect header engine (R1).
+"""
+import pandas as pd
+import numpy as np
+import re
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+
+from finlense_pdf import extract_tables
+
+# optional imports (try/except to avoid hard crash if not installed)
+try:
+    from openpyxl import load_workbook
+    import openpyxl
+except Exception:
+    load_workbook = None
+try:
+    import pyxlsb
+except Exception:
+    pyxlsb = None
+
+# -----------------------
+# Config
+# -----------------------
+IGNORED_STATUS_WORDS = {
+    "restated", "provisional", "unaudited", "reclassified",
+    "notes", "revised", "converted", "normalized", "n.a.", "n.a", "na", "unaudited/unauthorised"
+}
+
+# header-band detection patterns (period row scoring)
+YEAR_TOKEN_PATTERN = r"\d{4}|\d{4}[\-_–]\d{4}"     # 2 points
+PERIOD_TOKEN_PATTERN = r"[12]h|q[1-4]|ltm"           # 1 point (case-insensitive)
+LOOSE_YEAR_PATTERN = r"\b20\d{2}\b"
+HEADER_SCAN_ROWS = 30
+LOOSE_SCAN_ROWS = 50
+
+# learned layouts: sheets whose first rows, merged ranges and width match a known layout reuse its header band
+LAYOUT_ROWS = 12
+LAYOUT_VERSION = 1                                   # bump when the stored template changes
+LAYOUT_STORE_MAX = 1000
+DEFAULT_LAYOUT_FILE = os.environ.get(
+    "FINLENSE_LAYOUT_FILE",
+    os.path.join(os.path.expanduser("~"), ".cache", "finlense", "layouts.json")
+)
+
+# uploads stay in memory; readers that need a real path get a unique temp file, on tmpfs when available
+UPLOAD_TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+VALID_PARENT_KEYWORDS = {
+    "historical annual", "historical annuals", "historical interims",
+    "historical", "annual", "interim", "forecasts", "forecast",
+    "initial budget", "budget", "variation", "cagrars", "cagr"
+}
+
+# A3 formatter: TitleCase and underscores
+def format_token_for_output(token: str) -> str:
+    if not token:
+        return ""
+    t = " ".join(str(token).split())  # normalize whitespace
+    t = t.lower()
+    # remove trailing punctuation
+    t = re.sub(r"^[\s\W]+|[\s\W]+$", "", t)
+    words = [w.capitalize() for w in re.split(r"\s+", t) if w]
+    return "_".join(words)
+
+# token validator (strict rules)
+def is_valid_header_token(tok: str) -> bool:
+    if not tok:
+        return False
+    s = str(tok).strip()
+    if not s:
+        return False
+    t = s.lower()
+    if t in IGNORED_STATUS_WORDS:
+        return False
+    # 4-digit year
+    if re.fullmatch(r"\d{4}", t):
+        return True
+    # year range like 2020-2024 / 2020_2024 / 2020–2024
+    if re.fullmatch(r"\d{4}[\-_–]\d{4}", t):
+        return True
+    # periods like 1H, 2H, Q1-Q4, LTM
+    if re.fullmatch(r"[12]h", t) or re.fullmatch(r"q[1-4]", t) or t == "ltm":
+        return True
+    # parent detection (fuzzy)
+    base = re.sub(r"[^\w\s]", " ", t).replace("  ", " ").strip()
+    if "historical" in base and "annual" in base:
+        return True
+    if "historical" in base and "interim" in base:
+        return True
+    for kw in VALID_PARENT_KEYWORDS:
+        if kw in base:
+            return True
+    # otherwise reject numeric garbage, decimals, floats
+    if re.fullmatch(r"-?\d+\.\d+", t):
+        return False
+    # reject plain numbers that are not years
+    if t.isdigit():
+        return False
+    return False
+
+# clean values: map status words to NA, convert numbers, handle percent and parentheses
+def clean_value(x):
+    if pd.isna(x):
+        return pd.NA
+    s = str(x).strip()
+    if not s:
+        return pd.NA
+    ls = s.lower()
+    if ls in IGNORED_STATUS_WORDS:
+        return pd.NA
+    # percent
+    if s.endswith("%"):
+        try:
+            return float(s[:-1].replace(",", "").strip()) / 100.0
+        except Exception:
+            return s
+    # parentheses negative
+    if re.fullmatch(r"\(\s*[\d,\.]+\s*\)", s):
+        try:
+            return -float(s.strip("()").replace(",", ""))
+        except:
+            return s
+    # numeric
+    s_clean = s.replace(",", "")
+    if re.fullmatch(r"-?\d+(\.\d+)?", s_clean):
+        try:
+            return float(s_clean)
+        except:
+            return s
+    return s
+
+# columnar clean_value for whole frames. Excel numbers never become strings; text cells go through
+# column-level string ops with one float cast; anything the fast rules cannot vouch for (non-ASCII
+# text, odd percent forms like "1e3%", numbers that print in exponent form) goes through
+# clean_value itself, so the result is identical cell for cell.
+_WS = " \t\n\r\x0b\x0c"                      # what str.strip() removes from ASCII text
+_NOT_ASCII_TEXT = r"[^\t\n\x0b\x0c\r\x20-\x7e]"
+_PLAIN_NUMBER = r"-?[0-9]+(?:\.[0-9]+)?"
+_PCT_NUMBER = r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?"
+_PAREN_NUMBER = r"\([ \t\n\r\x0b\x0c]*[0-9,\.]+[ \t\n\r\x0b\x0c]*\)"
+_PAREN_CORE = r"[0-9]+\.?[0-9]*|\.[0-9]+"
+_NUMERIC_INFERRED = ("floating", "integer", "mixed-integer-float")
+
+def _mask(result):
+    return result.to_numpy(dtype=bool, na_value=False)
+
+def _to_float(strings):
+    # strings already validated as decimal numbers; arrow-backed strings cast natively
+    if getattr(strings.dtype, "storage", None) == "pyarrow":
+        return strings.astype("double[pyarrow]").to_numpy(dtype=np.float64)
+    return strings.to_numpy(dtype=object).astype(np.float64)
+
+def _clean_text(cells):
+    """cells: 1-D object array without NA. Returns (values, float mask, fallback mask)."""
+    n = len(cells)
+    out = np.empty(n, dtype=object)
+    numeric = np.zeros(n, dtype=bool)
+    fallback = np.zeros(n, dtype=bool)
+    s = pd.Series(cells, dtype=object).astype("string").str.strip(_WS)
+    plain = s.str.replace(",", "", regex=False)      # commas go once for the whole block
+
+    # the first and last character decide which rule can apply; each pattern runs on its cells only
+    pct = _mask(s.str.endswith("%"))
+    paren = _mask(s.str.startswith("(")) & ~pct
+    text = ~pct & ~paren
+
+    # "12.5 %": float() accepts more than the pattern, so the rest of these go to clean_value
+    idx = np.flatnonzero(pct)
+    inner = plain.iloc[idx].str.slice(stop=-1).str.strip(_WS)
+    ok = _mask(inner.str.fullmatch(_PCT_NUMBER))
+    out[idx[ok]] = (_to_float(inner[ok]) / 100.0).tolist()
+    numeric[idx[ok]] = True
+    fallback[idx[~ok]] = True
+
+    # "(1,234)"; anything else starting with "(" is plain text
+    idx = np.flatnonzero(paren)
+    core = plain.iloc[idx].str.slice(1, -1).str.strip(_WS)
+    ok = _mask(s.iloc[idx].str.fullmatch(_PAREN_NUMBER)) & _mask(core.str.fullmatch(_PAREN_CORE))
+    out[idx[ok]] = (-_to_float(core[ok])).tolist()
+    numeric[idx[ok]] = True
+    text[idx[~ok]] = True
+
+    # plain numbers ("1,234.5", "-12")
+    idx = np.flatnonzero(text)
+    ok = _mask(plain.iloc[idx].str.fullmatch(_PLAIN_NUMBER))
+    out[idx[ok]] = _to_float(plain.iloc[idx[ok]]).tolist()
+    numeric[idx[ok]] = True
+
+    # the rest is text or a status word; every match above is ASCII, so only these need the check
+    idx = idx[~ok]
+    r = s.iloc[idx]
+    fallback[idx[_mask(r.str.contains(_NOT_ASCII_TEXT))]] = True
+    missing = _mask((r == "") | r.str.lower().isin(IGNORED_STATUS_WORDS))
+    out[idx[missing]] = pd.NA
+    out[idx[~missing]] = r[~missing].to_numpy(dtype=object)
+    return out, numeric & ~fallback, fallback
+
+def clean_values(df):
+    """Vectorized df.applymap(clean_value): same values, same column dtypes."""
+    nrows, ncols = df.shape
+    if nrows == 0 or ncols == 0:
+        return df.copy()
+    cells = df.to_numpy(dtype=object).ravel(order="F")     # column after column
+    na = pd.isna(cells)
+    number = np.zeros(len(cells), dtype=bool)
+    for j in range(ncols):
+        part = slice(j * nrows, (j + 1) * nrows)
+        kind = pd.api.types.infer_dtype(cells[part], skipna=True)
+        if kind in _NUMERIC_INFERRED:
+            number[part] = ~na[part]
+        elif kind not in ("string", "empty"):
+            number[part] = np.fromiter((type(v) in (float, int) for v in cells[part]), dtype=bool, count=nrows)
+
+    out = np.empty(len(cells), dtype=object)
+    out[na] = pd.NA
+    fallback = np.zeros(len(cells), dtype=bool)
+
+    # Excel numbers: str(v) is plain decimal unless |v| < 1e-4 or >= 1e16 (exponent form) or v is inf
+    idx = np.flatnonzero(number)
+    values = cells[idx].astype(np.float64)
+    size = np.abs(values)
+    plain = (values == 0) | ((size >= 1e-4) & (size < 1e16))
+    out[idx] = values.tolist()
+    is_float = np.zeros(len(cells), dtype=bool)
+    is_float[idx[plain]] = True
+    fallback[idx[~plain]] = True
+
+    idx = np.flatnonzero(~number & ~na)
+    if len(idx):
+        out[idx], text_float, text_fallback = _clean_text(cells[idx])
+        is_float[idx[text_float]] = True
+        fallback[idx[text_fallback]] = True
+
+    for i in np.flatnonzero(fallback):
+        out[i] = clean_value(cells[i])
+        is_float[i] = type(out[i]) is float
+
+    # like applymap: a column of only floats becomes float64, anything else stays object
+    cols = {}
+    for j in range(ncols):
+        part = slice(j * nrows, (j + 1) * nrows)
+        cols[j] = out[part].astype(np.float64) if is_float[part].all() else out[part]
+    result = pd.DataFrame(cols, index=df.index)
+    result.columns = df.columns
+    return result
+
+# dedupe column names to avoid duplicates
+def dedupe_columns(cols):
+    out, counts = [], {}
+    for c in cols:
+        k = "" if c is None else str(c)
+        if k not in counts:
+            counts[k] = 0
+            out.append(k)
+        else:
+            counts[k] += 1
+            out.append(f"{k}_{counts[k]}")
+    return out
+
+# produce excel bytes for download
+def to_excel(groups):
+    out = BytesIO()
+    with pd.ExcelWriter(out, engine="openpyxl") as writer:
+        for cat, dfs in groups.items():
+            for i, df in enumerate(dfs, 1):
+                safe_sheet = (cat[:24] + f"_{i}") if cat else f"Sheet_{i}"
+                try:
+                    df.to_excel(writer, index=False, sheet_name=safe_sheet)
+                except Exception:
+                    # fallback name
+                    df.to_excel(writer, index=False, sheet_name=f"Sheet{i}")
+    out.seek(0)
+    return out
+
+# one parse per upload: raw grids + openpyxl worksheets (merged ranges) for every sheet
+class WorkbookSession:
+    ENGINES = {".xlsx": "openpyxl", ".xlsm": "openpyxl", ".xls": "xlrd", ".xlsb": "pyxlsb"}
+
+    def __init__(self, data, ext):
+        engine = self.ENGINES[ext]
+        self.book = None
+        if engine == "openpyxl":
+            # pandas reads straight from the loaded workbook, so the XML is parsed only here
+            self.book = load_workbook(BytesIO(data), data_only=True)
+            self.excel = pd.ExcelFile(self.book, engine="openpyxl")
+        else:
+            self.excel = pd.ExcelFile(BytesIO(data), engine=engine)
+        self.sheet_names = list(self.excel.sheet_names)
+        self._grids = {}
+
+    def grid(self, sheet):
+        # raw sheet, header=None, parsed on first use and kept
+        if sheet not in self._grids:
+            self._grids[sheet] = self.excel.parse(sheet, header=None, dtype=object)
+        return self._grids[sheet]
+
+    def worksheet(self, sheet):
+        return self.book[sheet] if self.book is not None else None
+
+    def merged_ranges(self, sheet):
+        # 0-based (first_row, first_col, last_row, last_col) of each merged range
+        ws = self.worksheet(sheet)
+        if ws is None:
+            return []
+        return sorted((r.min_row - 1, r.min_col - 1, r.max_row - 1, r.max_col - 1) for r in ws.merged_cells.ranges)
+
+# learned header bands by layout fingerprint, kept in one JSON file across runs
+# (one store is shared by all Streamlit sessions, i.e. threads: writes are serialized)
+class LayoutStore:
+    def __init__(self, path=DEFAULT_LAYOUT_FILE, max_entries=LAYOUT_STORE_MAX):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.layouts = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data["layouts"] if data.get("version") == LAYOUT_VERSION else {}
+        except Exception:
+            return {}
+
+    def get(self, fingerprint):
+        return self.layouts.get(fingerprint)
+
+    def put(self, fingerprint, template):
+        # merge with what other processes wrote meanwhile; newest last, oldest dropped first
+        with self.lock:
+            layouts = self._read()
+            layouts.pop(fingerprint, None)
+            layouts[fingerprint] = template
+            while len(layouts) > self.max_entries:
+                layouts.pop(next(iter(layouts)))
+            self.layouts = layouts
+            partial = None
+            try:
+                folder = os.path.dirname(self.path) or "."
+                os.makedirs(folder, exist_ok=True)
+                fd, partial = tempfile.mkstemp(prefix=".layouts_", suffix=".partial", dir=folder)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": LAYOUT_VERSION, "layouts": layouts}, f)
+                os.replace(partial, self.path)
+            except OSError:
+                pass  # read-only location: the layout is still known for this session
+            finally:
+                if partial and os.path.exists(partial):
+                    os.remove(partial)
+
+# unique temp copy of an upload for readers that only take paths; removed even on error
+@contextmanager
+def upload_temp_file(data, suffix=""):
+    fd, path = tempfile.mkstemp(prefix="finlense_", suffix=suffix, dir=UPLOAD_TEMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# pdf extraction (best-effort): page-parallel engine cascade with an on-disk page cache (finlense_pdf)
+def extract_tables_from_pdf(path, on_progress=None):
+    return extract_tables(path, max_workers=os.cpu_count() or 1, on_progress=on_progress)
+
+# -----------------------
+# Vectorized scanning helpers
+# -----------------------
+def string_block(df, stop=None):
+    # first `stop` rows as a 2-D object array of stripped strings ("" for NA), once per sheet
+    block = df.iloc[:stop] if stop is not None else df
+    values = block.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    flat = [("" if m else str(v).strip()) for v, m in zip(values.ravel(), missing.ravel())]
+    return np.array(flat, dtype=object).reshape(values.shape)
+
+def period_scores(text):
+    # score of every row at once: 2 per year / year range, 1 per half-year, quarter or LTM
+    if text.size == 0:
+        return np.zeros(text.shape[0], dtype=np.int64)
+    cells = pd.Series(text.ravel(), dtype=object)
+    years = cells.str.fullmatch(YEAR_TOKEN_PATTERN).to_numpy(dtype=bool)
+    periods = cells.str.fullmatch(PERIOD_TOKEN_PATTERN, case=False).to_numpy(dtype=bool)
+    scores = np.where(years, 2, np.where(periods, 1, 0))
+    return scores.reshape(text.shape).sum(axis=1)
+
+def numeric_cells(df):
+    # rows x cols bool matrix: cell is an int/float that is not NA
+    mask = np.zeros(df.shape, dtype=bool)
+    for j in range(df.shape[1]):
+        col = df.iloc[:, j]
+        if col.dtype.kind in "iufb":
+            mask[:, j] = col.notna().to_numpy()
+        elif col.dtype == object:
+            kind = pd.api.types.infer_dtype(col, skipna=True)
+            if kind == "floating":
+                mask[:, j] = col.notna().to_numpy()
+            elif kind not in ("string", "empty"):
+                mask[:, j] = np.fromiter((isinstance(v, (int, float)) and v == v for v in col.to_numpy()),
+                                         dtype=bool, count=len(col))
+    return mask
+
+def layout_fingerprint(text, sheet_ws, ncols):
+    # hash of the first rows' non-empty pattern, the merged ranges and the sheet width
+    # (not the row count: the same layout carries more or fewer data rows month to month)
+    top = text[:LAYOUT_ROWS] != ""
+    h = hashlib.sha256(f"{top.shape[0]}x{ncols}|".encode("utf-8"))
+    h.update(np.packbits(top).tobytes())
+    if sheet_ws is not None:
+        try:
+            merged = sorted((r.min_row, r.min_col, r.max_row, r.max_col) for r in sheet_ws.merged_cells.ranges)
+        except Exception:
+            merged = []
+        h.update(repr(merged).encode("utf-8"))
+    return h.hexdigest()
+
+def band_still_fits(df_raw, band):
+    # the fingerprint only sees which top cells are filled, so a stored band is checked before
+    # reuse: its header rows must hold text, its period row must still read as one and its
+    # meta row must still carry a status word (else the first data row would be skipped)
+    P, R, M = band
+    rows = [r for r in (P, R, M) if r is not None]
+    text = string_block(df_raw.iloc[rows])
+    if not (text != "").any(axis=1).all():
+        return False
+    if M is not None:
+        joined = " ".join(text[rows.index(M)]).lower()
+        if not any(s.lower() in joined for s in IGNORED_STATUS_WORDS):
+            return False
+    period = text[rows.index(R):rows.index(R) + 1]
+    if period_scores(period)[0] > 0:
+        return True
+    return pd.Series(period[0], dtype=object).str.contains(LOOSE_YEAR_PATTERN).sum() >= 2
+
+def band_digest(rows):
+    # content of the header band rows: learned headers are reused only while it is unchanged
+    return hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()
+
+def first_best_row(scores):
+    # first row with the highest positive score (None when no row scores)
+    if not len(scores) or scores.max() <= 0:
+        return None
+    return int(np.argmax(scores))
+
+# -----------------------
+# Auto-detect header band & build headers
+# -----------------------
+def detect_header_band_and_build(df_raw, sheet_ws=None, debug=False, layouts=None):
+    """
+    df_raw: pandas DataFrame header=None representing entire sheet (rows correspond to excel rows starting at 0)
+    sheet_ws: openpyxl worksheet object (optional, for merged detection and column widths)
+    layouts: LayoutStore (optional); a known layout skips band detection, new ones are learned
+    Returns:
+        master_notes_str, headers_list, data_df (data rows only, header rows removed)
+    """
+    # drop fully empty rows for scanning but keep mapping to original indexes
+    # convert the top of the sheet to strings once; all scans below read from it
+    nrows, ncols = df_raw.shape
+    text = string_block(df_raw, max(HEADER_SCAN_ROWS, LOOSE_SCAN_ROWS))
+
+    # build a small helper to get cell value (string) safely
+    def cell_str(r, c):
+        if 0 <= r < text.shape[0] and 0 <= c < ncols:
+            return text[r, c]
+        try:
+            v = df_raw.iat[r, c]
+            return "" if pd.isna(v) else str(v).strip()
+        except Exception:
+            return ""
+
+    def row_text(r):
+        return " ".join(text[r]) if 0 <= r < text.shape[0] else " ".join([cell_str(r, c) for c in range(ncols)])
+
+    # known layout (same first rows, merged ranges and width as a sheet seen before): reuse its band
+    fingerprint = layout_fingerprint(text, sheet_ws, ncols) if layouts is not None else None
+    template = layouts.get(fingerprint) if fingerprint else None
+    if template is not None and not all(r is None or r < nrows for r in template["band"]):
+        template = None
+    if template is not None and not band_still_fits(df_raw, template["band"]):
+        template = None
+
+    if template is not None:
+        P, R, M = template["band"]
+    else:
+        # find candidate period row: row with many 4-digit years or period tokens
+        # usually header bands appear in first ~30 rows
+        best_row = first_best_row(period_scores(text[:HEADER_SCAN_ROWS]))
+
+        # If not found in first 30, scan entire sheet (fallback)
+        if best_row is None and nrows > HEADER_SCAN_ROWS:
+            if nrows > text.shape[0]:
+                text = string_block(df_raw)
+            later = first_best_row(period_scores(text[HEADER_SCAN_ROWS:]))
+            best_row = None if later is None else HEADER_SCAN_ROWS + later
+
+        if best_row is None:
+            # fallback: try to find a row with multiple numeric like 2020-2025 or '2020' occurrences less strictly
+            loose = text[:LOOSE_SCAN_ROWS]
+            if loose.size:
+                hits = pd.Series(loose.ravel(), dtype=object).str.contains(LOOSE_YEAR_PATTERN).to_numpy(dtype=bool)
+                rows = np.flatnonzero(hits.reshape(loose.shape).sum(axis=1) >= 2)
+                if len(rows):
+                    best_row = int(rows[0])
+
+        # Determine parent row: scan upwards from period row to find a row containing parent keyword
+        parent_row = None
+        meta_row = None
+        if best_row is not None:
+            # look up to 6 rows above for parent indicator
+            for up in range(1, 7):
+                rr = best_row - up
+                if rr < 0:
+                    break
+                # combine row text
+                joined = row_text(rr)
+                if joined.strip():
+                    low = joined.strip().lower()
+                    # if row contains parent keywords, choose it
+                    if any(kw in low for kw in VALID_PARENT_KEYWORDS) or ("historical" in low and "annual" in low) or ("historical" in low and "interim" in low):
+                        parent_row = rr
+                        break
+            # if not found, choose nearest non-empty above period row (but not too far)
+            if parent_row is None:
+                for up in range(1, 8):
+                    rr = best_row - up
+                    if rr < 0:
+                        break
+                    if row_text(rr).strip():
+                        parent_row = rr
+                        break
+
+            # meta row: often right below period row (e.g., "Restated"), so check best_row+1
+            below = best_row + 1
+            if below < nrows:
+                joined = row_text(below).lower()
+                if any(s.lower() in joined for s in IGNORED_STATUS_WORDS):
+                    meta_row = below
+
+        # If still no parent_row or period row, fallback: assume header at top rows 0..2
+        if best_row is None:
+            parent_row = 0
+            best_row = 1
+            meta_row = 2 if nrows > 2 else None
+
+        # Now build headers using parent_row (P), period_row (R), meta_row (M)
+        P = parent_row
+        R = best_row
+        M = meta_row
+
+    # Build master notes: all rows above P (0..P-1)
+    notes_rows = []
+    for r in range(0, P):
+        joined = row_text(r).strip()
+        if joined:
+            notes_rows.append(joined)
+    master_notes = " | ".join(notes_rows).strip()
+    # Format master notes header for Column A (A3 style)
+    master_notes_header = format_token_for_output(master_notes) if master_notes else "Notes"
+
+    # Build header tokens for each column: Parent + (maybe period row token) + (maybe meta if meaningful)
+    band = band_digest([[cell_str(r, c) for c in range(ncols)] for r in (P, R, M) if r is not None])
+    if template is not None and template["band_digest"] == band:
+        headers = list(template["headers"])
+    else:
+        headers = []
+        for c in range(ncols):
+            parts = []
+            # Parent token: prefer merged cells if sheet_ws provided
+            ptoken = ""
+            if sheet_ws is not None:
+                try:
+                    # openpyxl uses 1-based indexing
+                    raw = sheet_ws.cell(row=P+1, column=c+1).value
+                    if raw is not None and str(raw).strip():
+                        ptoken = str(raw).strip()
+                    else:
+                        # maybe merged parent exists above (see merged ranges)
+                        ptoken = ""
+                except Exception:
+                    ptoken = ""
+
+            if not ptoken:
+                ptoken = cell_str(P, c)
+
+            # include parent token only if valid-ish and not a pure number
+            if ptoken and is_valid_header_token(ptoken):
+                parts.append(ptoken)
+
+            # sub/period token from period row R
+            rtoken = cell_str(R, c)
+            if rtoken and is_valid_header_token(rtoken):
+                parts.append(rtoken)
+
+            # meta (ignored per R1) -> do not include status words; but include if meta seems like "Variation" which is a header
+            mtoken = ""
+            if M is not None:
+                mtoken = cell_str(M, c)
+                if mtoken:
+                    lowm = mtoken.strip().lower()
+                    # include if it's a meaningful header token like 'variation' or 'ltm' or 'variation' etc.
+                    if lowm in ("variation", "variation%", "variance") or is_valid_header_token(mtoken):
+                        # but do not include Restated or similar (we ignore)
+                        if lowm not in IGNORED_STATUS_WORDS:
+                            parts.append(mtoken)
+
+            # If parts empty, but period row has year (even if parent missing) - keep year (we will try to salvage)
+            if not parts:
+                if rtoken and re.fullmatch(r"\d{4}", rtoken.strip()):
+                    parts.append(rtoken.strip())
+            # If still empty -> empty header
+            if parts:
+                # Format parts into A3 tokens
+                fmt_parts = [format_token_for_output(p) for p in parts]
+                headers.append("_".join(fmt_parts))
+            else:
+                headers.append("")  # will be dropped later
+        if layouts is not None and band_still_fits(df_raw, [P, R, M]):
+            layouts.put(fingerprint, {"band": [P, R, M], "band_digest": band, "headers": headers})
+
+    # Now build data frame removing header rows (rows 0.. up to R, plus possible meta row)
+    drop_upto = R
+    # We want data starting from first data row which is R+1 if meta is R+1 then R+2 etc.
+    start_row = R + 1
+    if M is not None and M == R + 1:
+        start_row = M + 1
+
+    # Ensure start_row within bounds
+    if start_row >= nrows:
+        start_row = min(nrows-1, R+1)
+
+    data_df = df_raw.iloc[start_row:].reset_index(drop=True).copy()
+    # assign headers (we'll set first column name as master_notes_header)
+    # but remove columns where headers are empty or deemed comment columns
+    # first set temporary columns
+    temp_cols = headers.copy()
+    # If first col header is empty but df has first col used as particulars, we will set it to 'Particulars' then rename to master header later.
+    if temp_cols and (temp_cols[0] == "" or temp_cols[0].lower() in ("nan", "none")):
+        temp_cols[0] = "Particulars"
+    # apply temp columns
+    data_df.columns = temp_cols
+
+    # clean cell values
+    data_df = clean_values(data_df)
+
+    # drop columns where header empty AND column largely empty
+    # (by position: repeated headers such as one year per block must each stay a single column)
+    names = list(data_df.columns)
+    has_header = np.array([bool(col and col.strip()) for col in names], dtype=bool)
+    # if column has any non-NA values maybe it's particulars column - keep if so
+    data_df = data_df.iloc[:, np.flatnonzero(has_header | data_df.notna().any().to_numpy())].copy()
+
+    # Now drop comment/noise columns heuristically:
+    # For each column except 'Particulars' keep if numeric ratio > 0.3 or header is meaningful
+    # (numeric share of every column at once from one boolean matrix, then one drop)
+    names = list(data_df.columns)
+    total = len(data_df)
+    if total == 0:
+        comment = np.ones(len(names), dtype=bool)
+    else:
+        non_numeric = total - numeric_cells(data_df).sum(axis=0)
+        # if more than 75% non-numeric and header not meaningful, treat as comment
+        comment = non_numeric / total >= 0.75
+        # but if header looks like a valid header token, or is Particulars / master notes placeholder, don't mark
+        keep_names = ("particulars", format_token_for_output(master_notes).lower(), "notes")
+        for i in np.flatnonzero(comment):
+            if is_valid_header_token(names[i]) or names[i].lower() in keep_names:
+                comment[i] = False
+    data_df = data_df.iloc[:, np.flatnonzero(~comment)]
+
+    # ensure first column is particulars; rename first column to master_notes_header (A3 formatted)
+    cols_final = list(data_df.columns)
+    if len(cols_final) == 0:
+        return master_notes_header, [], pd.DataFrame()
+    # if first column not "Particulars" try find a likely particulars column by searching for strings like 'Revenue', 'Profit', '%' etc in the top rows
+    first_col = cols_final[0]
+    # rename first column to master_notes header (as user requested Column A header)
+    new_cols = data_df.columns.tolist()
+    new_cols[0] = master_notes_header
+    data_df.columns = new_cols
+
+    # final cleanup: drop all-empty columns
+    data_df = data_df.dropna(axis=1, how="all")
+    # dedupe column names
+    data_df.columns = dedupe_columns(data_df.columns)
+
+    return master_notes_header, headers, data_df
@@ -0,0 +1,248 @@
+"""
+Page-parallel table extraction from PDFs for finlense.
+
+Every page runs an engine cascade - camelot (lattice), then pdfplumber, then tabula - that
+stops at the first engine yielding a well-formed table, so each table is extracted once
+instead of up to three times. Pages are spread over a process pool (this module stays free
+of Streamlit so workers can import it), and each page's tables are cached on disk under the
+PDF's SHA-256 and the page number: re-uploads only pay for pages not seen before. Pages
+without tables are cached like any other; pages on which every engine raised are not, so
+they are retried (e.g. after a transient failure). The least recently used entries are
+evicted above `FINLENSE_PDF_CACHE_MAX_BYTES`.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# optional engines (try/except to avoid hard crash if not installed)
+try:
+    import camelot
+except Exception:
+    camelot = None
+try:
+    import pdfplumber
+except Exception:
+    pdfplumber = None
+try:
+    import tabula
+except Exception:
+    tabula = None
+try:
+    from pypdf import PdfReader
+except Exception:
+    PdfReader = None
+
+# =====================================================
+# CONFIGURATION
+# =====================================================
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "FINLENSE_PDF_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "finlense_pdf_cache")
+)
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get("FINLENSE_PDF_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+CACHE_LAYOUT = 2                                       # bump when cached page entries change
+ENGINES = ["camelot", "pdfplumber", "tabula"]          # cascade order
+FAILED = "error"                                       # engine of a page on which every engine raised
+ALL_PAGES = "all"                                      # used when the page count is unknown
+MIN_TABLE_ROWS = 2
+MIN_TABLE_COLS = 2
+
+# =====================================================
+# ENGINES (one page each; every engine returns header-less grids)
+# =====================================================
+
+def _camelot_tables(path, page):
+    return [t.df for t in camelot.read_pdf(path, pages=str(page), flavor="lattice")]
+
+
+def _pdfplumber_tables(path, page):
+    with pdfplumber.open(path, pages=None if page == ALL_PAGES else [page]) as pdf:
+        return [pd.DataFrame(tbl) for p in pdf.pages for tbl in p.extract_tables()]
+
+
+def _tabula_tables(path, page):
+    return tabula.read_pdf(path, pages=page, multiple_tables=True, pandas_options={"header": None})
+
+
+_READERS = {
+    "camelot": (lambda: camelot is not None, _camelot_tables),
+    "pdfplumber": (lambda: pdfplumber is not None, _pdfplumber_tables),
+    "tabula": (lambda: tabula is not None, _tabula_tables),
+}
+
+
+def available_engines():
+    return [name for name in ENGINES if _READERS[name][0]()]
+
+
+def well_formed(df):
+    """At least MIN_TABLE_ROWS rows and MIN_TABLE_COLS columns that hold something besides blanks."""
+    if not isinstance(df, pd.DataFrame) or df.shape[0] < MIN_TABLE_ROWS or df.shape[1] < MIN_TABLE_COLS:
+        return False
+    filled = df.notna() & (df.astype(str).apply(lambda c: c.str.strip()) != "")
+    return filled.any(axis=1).sum() >= MIN_TABLE_ROWS and filled.any(axis=0).sum() >= MIN_TABLE_COLS
+
+
+def page_tables(path, page, engines=None):
+    """
+    Engine cascade for one page: the first engine that yields well-formed tables wins.
+    Returns {"engine": name, None (engines ran, no table) or FAILED (every engine raised),
+    "tables": [DataFrame, ...]}.
+    """
+    ran = False
+    for name in engines or available_engines():
+        try:
+            tables = [t for t in _READERS[name][1](path, page) if well_formed(t)]
+        except Exception:
+            continue
+        ran = True
+        if tables:
+            return {"engine": name, "tables": tables}
+    return {"engine": None if ran else FAILED, "tables": []}
+
+
+def page_count(path):
+    """Number of pages, or None when no installed library can tell."""
+    try:
+        if PdfReader is not None:
+            return len(PdfReader(path).pages)
+        if pdfplumber is not None:
+            with pdfplumber.open(path) as pdf:
+                return len(pdf.pages)
+    except Exception:
+        pass
+    return None
+
+# =====================================================
+# PAGE CACHE
+# =====================================================
+
+def pdf_digest(path):
+    """SHA-256 hex digest of the PDF bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_path(digest, page, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{digest}_p{page}_v{CACHE_LAYOUT}.pkl")
+
+
+def cached_page(digest, page, cache_dir=DEFAULT_CACHE_DIR):
+    """Cached page entry, or None on a miss (an unreadable entry counts as a miss)."""
+    path = cache_path(digest, page, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            entry = pickle.load(f)
+        os.utime(path, None)
+        return entry
+    except Exception:
+        return None
+
+
+def store_page(digest, page, entry, cache_dir=DEFAULT_CACHE_DIR):
+    """Written to a unique temp name first, so a half-written entry is never read."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(digest, page, cache_dir)
+    fd, partial = tempfile.mkstemp(suffix=".partial", dir=cache_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def evict(cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """Drop least recently used page entries until the cache fits in `max_bytes`."""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".pkl"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # removed by a concurrent eviction
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+# =====================================================
+# DRIVER
+# =====================================================
+
+_PDF_PATH = None
+
+
+def _init_pdf_worker(path):
+    """Pool initializer: the PDF path reaches each worker once."""
+    global _PDF_PATH
+    _PDF_PATH = path
+
+
+def _page_worker(page):
+    return page, page_tables(_PDF_PATH, page)
+
+
+def extract_tables(path, max_workers=1, cache_dir=DEFAULT_CACHE_DIR, on_progress=None,
+                   max_cache_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """
+    All well-formed tables of the PDF at `path`, in page order.
+    Pages missing from the cache run in a pool of `max_workers` processes (cache_dir=None
+    disables the cache); `on_progress(done, total)` runs as pages finish.
+    """
+    if not available_engines():
+        return []
+    digest = pdf_digest(path) if cache_dir else None
+    n_pages = page_count(path)
+    pages = list(range(1, n_pages + 1)) if n_pages else [ALL_PAGES]
+
+    entries = {}
+    if digest:
+        for page in pages:
+            entry = cached_page(digest, page, cache_dir)
+            if entry is not None:
+                entries[page] = entry
+    todo = [page for page in pages if page not in entries]
+
+    def finished(page, entry):
+        entries[page] = entry
+        # every engine raised: possibly transient, never cached
+        if digest and entry["engine"] != FAILED:
+            store_page(digest, page, entry, cache_dir)
+        if on_progress:
+            on_progress(len(entries), len(pages))
+
+    if max_workers <= 1 or len(todo) <= 1:
+        _init_pdf_worker(path)
+        for page in todo:
+            finished(*_page_worker(page))
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(todo)),
+                                 initializer=_init_pdf_worker, initargs=(path,)) as pool:
+            for page, entry in pool.map(_page_worker, todo):
+                finished(page, entry)
+
+    if digest and todo:
+        evict(cache_dir, max_cache_bytes)
+    return [t for page in pages for t in entries[page]["tables"]]
@@ -0,0 +1,42 @@
+import io
+
+import pandas as pd
+
+from excel_compare_baseline import candidate_ids, changed_cells_matrix, compare_baseline, index_baseline
+
+
+def _workbook(**sheets):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+def _sheets(**sheets):
+    return {name: df.astype(str) for name, df in sheets.items()}
+
+
+def test_candidate_ids_keep_same_named_files_apart():
+    assert candidate_ids(["emea/Fin.xlsx", "apac/Fin.xlsx", "Fin.xls", "Q1 plan.xlsx"]) == [
+        "Fin", "Fin_2", "Fin_3", "Q1_plan"
+    ]
+
+
+def test_baseline_matrix_counts_changed_cells_per_sheet_and_candidate(tmp_path):
+    data = pd.DataFrame({"Item": ["a", "b", "c"], "Value": [1, 2, 3]})
+    baseline = index_baseline(_sheets(Data=data, Notes=pd.DataFrame({"Text": ["x"]})))
+    names = ["emea/Fin.xlsx", "apac/Fin.xlsx"]
+    candidates = dict(zip(candidate_ids(names), [
+        _workbook(Data=data.assign(Value=[1, 20, 3]), Notes=pd.DataFrame({"Text": ["x"]})),
+        _workbook(Data=data.assign(Value=[10, 20, 30])),
+    ]))
+
+    records = compare_baseline(baseline, candidates, cache_dir=str(tmp_path / "cache"))
+    matrix = changed_cells_matrix(baseline, records)
+
+    assert [rec["status"] for rec in records] == ["ok", "ok"]
+    assert list(matrix.columns) == ["Fin", "Fin_2"]
+    assert matrix.loc["Data"].tolist() == [1, 3]
+    assert matrix.loc["Notes", "Fin"] == 0 and pd.isna(matrix.loc["Notes", "Fin_2"])
+    assert records[0]["report"][:2] == b"PK"
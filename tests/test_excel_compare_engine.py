@@ -0,0 +1,224 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from excel_compare_engine import (
+    CellDetailStore, _key_codes, _key_labels, auto_map_sheets, build_pair_tasks, collapse_diff_ranges,
+    compare_pairs, compare_sheets, compare_sheets_streaming, parse_workbook, sheet_digest, type_sheet
+)
+
+
+def _typed_pair():
+    # "id" is numeric in A but holds text in B, so type_sheet types it in A only
+    dfA = type_sheet(pd.DataFrame({
+        "id": ["1", "2", "3", None],
+        "grp": ["a", "b", None, "b"],
+        "val": ["10", "20", "30", "40"],
+    }))
+    dfB = type_sheet(pd.DataFrame({
+        "id": ["1", "2", "x", None],
+        "grp": ["a", "b", None, "b"],
+        "val": ["10", "21", "30", "40"],
+    }))
+    return dfA, dfB
+
+
+def test_key_mode_matches_columns_typed_differently_per_workbook():
+    dfA, dfB = _typed_pair()
+    assert dfA["id"].dtype.kind == "f" and dfB["id"].dtype.kind != "f"
+
+    result = compare_sheets(dfA, dfB, key_cols=["id", "grp"])
+
+    assert result["changed_cells"] == 1
+    assert result["inserted_rows"] == 1
+    assert result["deleted_rows"] == 1
+    assert result["diff_df"]["Column Name"].tolist() == ["val"]
+
+
+def test_fingerprint_mode_matches_columns_typed_differently_per_workbook():
+    dfA, dfB = _typed_pair()
+
+    result = compare_sheets(dfA, dfB, fingerprint=True)
+
+    assert result["unchanged_rows"] == 2
+    assert result["modified_rows"] == 2
+    assert result["changed_cells"] == 2
+
+
+def test_null_key_parts_do_not_collide():
+    dfA = pd.DataFrame({"k1": ["a", "b"], "k2": [2.0, np.nan]})
+
+    codesA, codesB = _key_codes(dfA, dfA, ["k1", "k2"])
+
+    assert codesA[0] != codesA[1]
+    assert (codesA == codesB).all()
+
+
+def test_null_keys_pair_with_null_keys():
+    dfA = pd.DataFrame({"k1": ["a", "b", "b"], "k2": [2.0, np.nan, 3.0], "v": ["x", "y", "z"]})
+    dfB = dfA.iloc[[2, 1, 0]].reset_index(drop=True)
+    dfB.loc[1, "v"] = "changed"
+
+    result = compare_sheets(dfA, dfB, key_cols=["k1", "k2"])
+
+    assert result["inserted_rows"] == 0 and result["deleted_rows"] == 0
+    assert result["diff_df"]["Key"].tolist() == ["k1=b | k2="]
+
+
+def test_key_labels_with_null_keys():
+    df = pd.DataFrame({"k": pd.Series(["a", None], dtype="string"), "n": [1.0, np.nan]})
+
+    labels = _key_labels(df, ["k", "n"], np.array([0, 1]))
+
+    assert labels.tolist() == ["k=a | n=1.0", "k= | n="]
+
+
+def test_names_only_mapping_keeps_close_names():
+    mapping = auto_map_sheets({"Data 2023": None, "Notes": None}, {"Data 2024": None, "Misc": None})
+
+    assert [(a, b) for a, b, _ in mapping] == [("Data 2023", "Data 2024"), ("Notes", None)]
+
+
+def test_same_named_sheets_pair_even_when_content_changed():
+    rng = np.random.default_rng(0)
+    sheetsA = {"P&L": pd.DataFrame(rng.integers(0, 9, (100, 4)).astype(str), columns=["Item", "FY21", "FY22", "FY23"])}
+    sheetsB = {"p&l": pd.DataFrame(rng.integers(0, 9, (900, 4)).astype(str), columns=["Item", "FY22", "FY23", "FY24"])}
+
+    assert [(a, b) for a, b, _ in auto_map_sheets(sheetsA, sheetsB)] == [("P&L", "p&l")]
+
+
+def test_key_mode_reports_inserted_deleted_and_changed_rows_instead_of_a_shifted_diff():
+    dfA = pd.DataFrame({"id": ["1", "2", "3", "4"], "name": ["a", "b", "c", "d"], "val": ["10", "20", "30", "40"]})
+    # a new row on top, row "3" deleted, row "4" changed
+    dfB = pd.DataFrame({"id": ["0", "1", "2", "4"], "name": ["z", "a", "b", "d"], "val": ["0", "10", "20", "41"]})
+
+    result = compare_sheets(dfA, dfB, key_cols=["id"])
+
+    assert (result["inserted_rows"], result["deleted_rows"], result["modified_rows"]) == (1, 1, 1)
+    assert result["inserted_df"][["Row Number", "id"]].values.tolist() == [[2, "0"]]
+    assert result["deleted_df"][["Row Number", "id"]].values.tolist() == [[4, "3"]]
+    assert result["diff_df"][["Key", "Row Number", "Column Name", "Workbook A Value", "Workbook B Value"]].values.tolist() == [
+        ["id=4", 5, "val", "40", "41"]
+    ]
+    assert compare_sheets(dfA, dfB)["changed_cells"] == 10     # positional: every shifted row differs
+
+
+def test_repeated_keys_pair_by_order_of_appearance():
+    dfA = pd.DataFrame({"id": ["x", "x", "y"], "val": ["1", "2", "3"]})
+    dfB = pd.DataFrame({"id": ["y", "x", "x", "x"], "val": ["3", "1", "9", "4"]})
+
+    result = compare_sheets(dfA, dfB, key_cols=["id"])
+
+    assert result["diff_df"][["Row Number", "Workbook A Value", "Workbook B Value"]].values.tolist() == [[3, "2", "9"]]
+    assert result["inserted_df"]["val"].tolist() == ["4"]
+    assert result["deleted_rows"] == 0
+
+
+def _xlsx(**sheets):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+def test_streaming_mode_matches_the_in_memory_comparison_across_chunks():
+    rows = 23
+    sheetA = pd.DataFrame({"Item": [f"i{r}" for r in range(rows)], "Value": list(range(rows)), "OnlyA": ["a"] * rows})
+    sheetB = pd.DataFrame({"Value": list(range(rows)) + [99, 100], "Item": [f"i{r}" for r in range(rows)] + ["n1", "n2"]})
+    sheetB.loc[[0, 7, 20], "Value"] = -1
+    sheetB.loc[7, "Item"] = None
+    dataA, dataB = _xlsx(Data=sheetA), _xlsx(Data=sheetB)
+
+    streamed = compare_sheets_streaming(io.BytesIO(dataA), io.BytesIO(dataB), "Data", "Data", chunk_size=5)
+    loaded = compare_sheets(parse_workbook(io.BytesIO(dataA))["Data"], parse_workbook(io.BytesIO(dataB))["Data"])
+
+    pd.testing.assert_frame_equal(streamed["diff_df"], loaded["diff_df"], check_dtype=False)
+    for key in ("common_cols", "extra_cols_A", "extra_cols_B", "row_difference", "changed_cells"):
+        assert streamed[key] == loaded[key]
+    assert streamed["changed_cells"] == 8 and streamed["row_difference"] == -2
+
+
+def _three_sheet_workbooks():
+    base = pd.DataFrame({"Item": ["a", "b", "c"], "Value": [1, 2, 3]})
+    dataA = _xlsx(One=base, Two=base, Three=base)
+    dataB = _xlsx(One=base.assign(Value=[1, 5, 3]), Two=base, Three=base.assign(Item=["x", "y", "c"]))
+    mapping = [("One", "One", False), ("Two", "Two", False), ("Three", "Three", False)]
+    return dataA, dataB, mapping
+
+
+def _without_timings(results):
+    return [{k: v for k, v in r.items() if k not in ("elapsed", "cached")} for r in results]
+
+
+def test_pool_results_come_back_in_mapping_order_and_match_a_sequential_run():
+    dataA, dataB, mapping = _three_sheet_workbooks()
+    sheetsA, sheetsB = parse_workbook(io.BytesIO(dataA)), parse_workbook(io.BytesIO(dataB))
+
+    for sources in ({}, {"sourceA": dataA, "sourceB": dataB, "chunk_size": 2}):
+        tasks, _ = build_pair_tasks(sheetsA, sheetsB, mapping, **sources)
+        progress = []
+        pooled = compare_pairs(tasks, max_workers=2, on_progress=lambda done, total, task, _: progress.append(done))
+        serial = compare_pairs(tasks)
+
+        assert [r["changed_cells"] for r in pooled] == [1, 0, 2]
+        assert sorted(progress) == [1, 2, 3]
+        for a, b in zip(_without_timings(pooled), _without_timings(serial)):
+            assert a.keys() == b.keys()
+            pd.testing.assert_frame_equal(a.pop("diff_df"), b.pop("diff_df"))
+            assert a == b
+
+
+def test_changed_cells_collapse_into_rectangular_ranges():
+    dfA = pd.DataFrame({"A": ["k"] * 6, "B": ["1"] * 6, "C": ["1"] * 6, "D": ["1"] * 6})
+    dfB = dfA.copy()
+    dfB.loc[0:3, ["B", "C"]] = "2"          # B2:C5, one rectangle of 8 cells
+    dfB.loc[5, "C"] = "3"                   # C7 alone
+    dfB.loc[[1, 2], "D"] = "4"              # D3:D4 does not line up with B:C
+    diff_df = compare_sheets(dfA, dfB)["diff_df"]
+
+    ranges = collapse_diff_ranges(diff_df)
+
+    assert ranges[["Range", "Columns", "Changed Cells"]].values.tolist() == [
+        ["B2:C5", "B .. C", 8], ["C7", "C", 1], ["D3:D4", "D", 2]
+    ]
+    assert ranges["Changed Cells"].sum() == len(diff_df)
+    assert ranges.loc[1, ["Sample A Value", "Sample B Value"]].tolist() == ["1", "3"]
+
+
+def test_cell_detail_store_returns_the_cells_of_a_range():
+    dfA = pd.DataFrame({"A": ["1"] * 5, "B": ["1"] * 5})
+    dfB = pd.DataFrame({"A": ["2"] * 5, "B": ["1", "2", "1", "2", "1"]})
+    store = CellDetailStore(compare_sheets(dfA, dfB)["diff_df"])
+
+    assert len(store) == 7
+    assert store.cells("A3:A5")["Row Number"].tolist() == [3, 4, 5]
+    assert store.cells("$B$1:$B$100")["Row Number"].tolist() == [3, 5]
+    assert store.cells("b3")["Column Letter"].tolist() == ["B"]
+    assert store.cells("C1:Z9").empty
+
+
+def test_rerun_recomputes_only_pairs_whose_sheets_or_options_changed():
+    dataA, dataB, mapping = _three_sheet_workbooks()
+    sheetsA, sheetsB = parse_workbook(io.BytesIO(dataA)), parse_workbook(io.BytesIO(dataB))
+    cache = {}
+
+    def run(sheetsB, **options):
+        digestsA = {name: sheet_digest(df) for name, df in sheetsA.items()}
+        digestsB = {name: sheet_digest(df) for name, df in sheetsB.items()}
+        tasks, _ = build_pair_tasks(sheetsA, sheetsB, mapping, digestsA=digestsA, digestsB=digestsB, **options)
+        return compare_pairs(tasks, result_cache=cache)
+
+    first = run(sheetsB)
+    again = run(sheetsB)
+    edited = run(dict(sheetsB, Two=sheetsB["Two"].replace("b", "B")))
+    keyed = run(sheetsB, key_cols=["Item"])
+
+    assert [r.get("cached", False) for r in first] == [False, False, False]
+    assert [r.get("cached", False) for r in again] == [True, True, True]
+    assert [r["changed_cells"] for r in again] == [r["changed_cells"] for r in first]
+    assert [r.get("cached", False) for r in edited] == [True, False, True]
+    assert edited[1]["changed_cells"] == 1
+    assert [r.get("cached", False) for r in keyed] == [False, False, False]
+    assert len(cache) == 7
@@ -0,0 +1,94 @@
+import io
+import os
+import threading
+
+import pandas as pd
+
+from financials_engine import SHEET_COL, cached_export, evict_exports, export_path, flatten_workbook, write_export
+
+
+def _financials_workbook():
+    buffer = io.BytesIO()
+    sheet = pd.DataFrame([
+        ["", "Revenue", "Revenue", "Cost"],
+        ["", "Product", "Service", "Total"],
+        ["", "2023", "2023", "2023"],
+        ["North", 1, 2, 3],
+        ["South", 4, 5, 6],
+    ])
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        sheet.to_excel(writer, sheet_name="FY23", header=False, index=False)
+        sheet.replace("2023", "2024").to_excel(writer, sheet_name="FY24", header=False, index=False)
+        pd.DataFrame([["too short"]]).to_excel(writer, sheet_name="Cover", header=False, index=False)
+    return buffer.getvalue()
+
+
+def test_flatten_workbook_parses_each_sheet_once(monkeypatch):
+    parsed = []
+    parse = pd.ExcelFile.parse
+
+    def counting_parse(self, sheet_name=0, *args, **kwargs):
+        parsed.append(sheet_name)
+        return parse(self, sheet_name, *args, **kwargs)
+
+    monkeypatch.setattr(pd.ExcelFile, "parse", counting_parse)
+    data = _financials_workbook()
+
+    pooled, skipped = flatten_workbook(data, max_workers=2)
+    serial, _ = flatten_workbook(data)
+
+    assert parsed == ["FY23", "FY24", "Cover"] * 2
+    assert [name for name, _ in skipped] == ["Cover"]
+    assert len(pooled) == 12 and list(pooled[SHEET_COL].unique()) == ["FY23", "FY24"]
+    pd.testing.assert_frame_equal(pooled, serial)
+
+
+def _long_frame(n=50):
+    return pd.DataFrame({"Section": ["Revenue"] * n, "Year": [str(2000 + i) for i in range(n)], "Value": range(n)})
+
+
+def test_export_is_generated_once_and_then_served_from_disk(tmp_path):
+    export_dir = str(tmp_path)
+    df = _long_frame()
+
+    assert cached_export("abc", "csv", export_dir) is None
+    path = write_export(df, "abc", "csv", export_dir)
+    os.utime(path, (1000, 1000))
+
+    assert write_export(df.head(1), "abc", "csv", export_dir) == path
+    assert len(pd.read_csv(path)) == len(df)
+    assert os.path.getmtime(path) > 1000
+
+
+def test_concurrent_exports_of_one_digest_publish_a_complete_file(tmp_path):
+    export_dir = str(tmp_path)
+    df = _long_frame(5000)
+    errors = []
+
+    def export():
+        try:
+            write_export(df, "same", "xlsx", export_dir, chunk_rows=100)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=export) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert os.listdir(export_dir) == [os.path.basename(export_path("same", "xlsx", export_dir))]
+    assert len(pd.read_excel(export_path("same", "xlsx", export_dir))) == len(df)
+
+
+def test_least_recently_used_exports_are_evicted(tmp_path):
+    export_dir = str(tmp_path)
+    df = _long_frame()
+    paths = [write_export(df, digest, "csv", export_dir) for digest in ("old", "mid", "new")]
+    for i, path in enumerate(paths):
+        os.utime(path, (1000 + i, 1000 + i))
+
+    evict_exports(export_dir, max_bytes=2 * os.path.getsize(paths[0]))
+
+    assert [os.path.exists(p) for p in paths] == [False, True, True]
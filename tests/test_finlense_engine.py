@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+from finlense_engine import LayoutStore, clean_value, clean_values, detect_header_band_and_build
+
+
+def _sheet(nrows, period_row):
+    rows = [[None] * 4 for _ in range(nrows)]
+    rows[period_row - 1] = ["Historical Annual", "", "", ""]
+    rows[period_row] = ["Particulars", "1H", "2H", "LTM"]
+    for r in range(period_row + 1, nrows):
+        rows[r] = [f"Item {r}", r, r + 1, r + 2]
+    return pd.DataFrame(rows, dtype=object)
+
+
+def test_period_row_found_in_the_first_scan():
+    _, headers, data = detect_header_band_and_build(_sheet(20, 5))
+
+    assert headers == ["Historical_Annual", "1h", "2h", "Ltm"]
+    assert len(data) == 14
+
+
+def test_period_row_past_the_first_scan_in_a_short_sheet():
+    # 45 rows: inside the pre-built 50-row text block, but past HEADER_SCAN_ROWS
+    _, headers, data = detect_header_band_and_build(_sheet(45, 35))
+
+    assert headers == ["Historical_Annual", "1h", "2h", "Ltm"]
+    assert len(data) == 9
+    assert data.iloc[0, 0] == "Item 36"
+
+
+# cells that exercise every rule of clean_value, plus the inputs the fast path hands back to it
+GOLDEN_CELLS = [
+    None, np.nan, pd.NA, "", "   ", "\t", "n.a.", "NA", "Restated", "unaudited/unauthorised",
+    "0", "12", "-12", "1,234.5", " 1,234 ", "1.", ".5", "-.5", "+7", "1e3", "01", "12a", "-", "--1",
+    "12%", " 12.5 % ", "-3%", "+3%", "1,000%", "%", "abc%", "1e3%", ".5%", "5.%",
+    "(12)", "( 1,234.5 )", "(1.2.3)", "(,)", "()", "(-1)", "(12", "12)",
+    "Revenue", "EBITDA margin", "２０２４", "١٢٣", "12 ", " 12%", "€12", "12 345",
+    0, 1, -7, 10 ** 17, 3.25, -0.0, 1e-5, 2.5e-4, 1e16, 9.99e15, float("inf"), float("-inf"),
+    True, False, np.int64(5), np.float64(2.5),
+]
+
+
+def _reference(df):
+    return df.map(clean_value) if hasattr(df, "map") else df.applymap(clean_value)
+
+
+def test_clean_values_matches_clean_value_on_the_golden_cells():
+    cells = pd.Series(GOLDEN_CELLS, dtype=object)
+    df = pd.DataFrame({"mixed": cells, "reversed": cells[::-1].to_numpy()}, dtype=object)
+
+    pd.testing.assert_frame_equal(clean_values(df), _reference(df))
+
+
+def test_clean_values_matches_clean_value_per_column_kind():
+    df = pd.DataFrame({
+        "floats": pd.Series([1.5, np.nan, 1e-5, 2.0], dtype=object),
+        "ints": pd.Series([1, 2, 10 ** 17, None], dtype=object),
+        "numbers_as_text": ["1,000", "(5)", "12%", "n.a."],
+        "text": ["Revenue", "Cost", "", None],
+    })
+
+    pd.testing.assert_frame_equal(clean_values(df), _reference(df))
+
+
+def test_clean_values_matches_clean_value_on_random_cells():
+    rng = np.random.default_rng(20240301)
+    pieces = ["1", "2", "0", ",", ".", "-", "+", "%", "(", ")", " ", "e", "a", "n", " ", "٣"]
+    cells = []
+    for _ in range(3000):
+        kind = rng.integers(5)
+        if kind == 0:
+            cells.append("".join(rng.choice(pieces, rng.integers(0, 8))))
+        elif kind == 1:
+            cells.append(float(rng.normal(0, 10.0 ** rng.integers(-6, 18))))
+        elif kind == 2:
+            cells.append(int(rng.integers(-10 ** 9, 10 ** 9)))
+        elif kind == 3:
+            cells.append(f"{rng.normal(0, 1e4):,.{rng.integers(0, 4)}f}")
+        else:
+            cells.append(GOLDEN_CELLS[rng.integers(len(GOLDEN_CELLS))])
+    df = pd.DataFrame(np.array(cells, dtype=object).reshape(300, 10), dtype=object)
+
+    pd.testing.assert_frame_equal(clean_values(df), _reference(df))
+
+
+def _dense_sheet(top, nrows=20):
+    rows = [list(r) for r in top] + [[f"Item {i}", i, i + 1, i + 2] for i in range(nrows - len(top))]
+    return pd.DataFrame(rows, dtype=object)
+
+
+def test_learned_layout_is_not_reused_for_a_different_band(tmp_path):
+    # dense tables of one width share a layout fingerprint whatever their header rows hold
+    first = _dense_sheet([["Company", "A", "B", "C"], ["Historical Annual", "2021", "2022", "2023"]])
+    second = _dense_sheet([
+        ["Note", "n", "n", "n"], ["Source", "s", "s", "s"],
+        ["Historical Annual", "H", "H", "H"], ["Particulars", "2021", "2022", "2023"],
+    ])
+    layouts = LayoutStore(str(tmp_path / "layouts.json"))
+
+    detect_header_band_and_build(first, layouts=layouts)
+    _, headers, data = detect_header_band_and_build(second, layouts=layouts)
+    _, fresh_headers, fresh_data = detect_header_band_and_build(second)
+
+    assert headers == fresh_headers == ["Historical_Annual", "2021", "2022", "2023"]
+    pd.testing.assert_frame_equal(data, fresh_data)
+
+
+def test_learned_layout_is_reused_for_the_same_band(tmp_path):
+    sheet = _sheet(20, 5)
+    layouts = LayoutStore(str(tmp_path / "layouts.json"))
+
+    detect_header_band_and_build(sheet, layouts=layouts)
+    reloaded = LayoutStore(str(tmp_path / "layouts.json"))
+    _, headers, _ = detect_header_band_and_build(sheet, layouts=reloaded)
+
+    assert len(reloaded.layouts) == 1
+    assert headers == ["Historical_Annual", "1h", "2h", "Ltm"]
+
+
+def test_learned_layout_with_a_status_row_is_not_reused_once_the_row_is_gone(tmp_path):
+    # same fill pattern both months: "Restated" one month, a data row the next
+    def sheet(meta):
+        rows = [["Historical Annual", "x", "x", "x"], ["Particulars", "2021", "2022", "2023"], meta]
+        return _dense_sheet(rows, nrows=15)
+    layouts = LayoutStore(str(tmp_path / "layouts.json"))
+
+    detect_header_band_and_build(sheet(["Restated"] * 4), layouts=layouts)
+    _, _, data = detect_header_band_and_build(sheet(["Item X", 7, 8, 9]), layouts=layouts)
+    _, _, fresh = detect_header_band_and_build(sheet(["Item X", 7, 8, 9]))
+
+    assert data.iloc[0, 0] == "Item X"
+    pd.testing.assert_frame_equal(data, fresh)
@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+import finlense_pdf
+
+
+TABLE = pd.DataFrame([["Revenue", "1"], ["Cost", "2"]])
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    """Replace the engine registry with fakes; returns (install(name, reader), calls)."""
+    calls = []
+    for name in finlense_pdf.ENGINES:
+        monkeypatch.setitem(finlense_pdf._READERS, name, (lambda: False, None))
+
+    def install(name, reader):
+        def counted(path, page):
+            calls.append(name)
+            return reader(path, page)
+        monkeypatch.setitem(finlense_pdf._READERS, name, (lambda: True, counted))
+    return install, calls
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"%PDF-1.4 not a real document")
+    return str(path)
+
+
+def _raise(path, page):
+    raise RuntimeError("engine failed")
+
+
+def test_cascade_stops_at_the_first_engine_with_a_well_formed_table(engines, pdf):
+    install, calls = engines
+    install("camelot", _raise)
+    install("pdfplumber", lambda path, page: [pd.DataFrame([["only one cell"]]), TABLE])
+    install("tabula", lambda path, page: [TABLE])
+
+    entry = finlense_pdf.page_tables(pdf, 1)
+
+    assert entry["engine"] == "pdfplumber"
+    assert len(entry["tables"]) == 1
+    assert calls == ["camelot", "pdfplumber"]
+
+
+def test_pages_without_tables_are_cached(engines, pdf, tmp_path):
+    install, calls = engines
+    install("camelot", lambda path, page: [])
+    install("tabula", lambda path, page: [])
+    cache = str(tmp_path / "cache")
+
+    assert finlense_pdf.extract_tables(pdf, cache_dir=cache) == []
+    assert finlense_pdf.extract_tables(pdf, cache_dir=cache) == []
+
+    assert calls == ["camelot", "tabula"]
+
+
+def test_pages_where_every_engine_failed_are_retried(engines, pdf, tmp_path):
+    install, calls = engines
+    install("camelot", _raise)
+    cache = str(tmp_path / "cache")
+
+    assert finlense_pdf.extract_tables(pdf, cache_dir=cache) == []
+    install("camelot", lambda path, page: [TABLE])
+    tables = finlense_pdf.extract_tables(pdf, cache_dir=cache)
+
+    assert len(tables) == 1
+    assert calls == ["camelot", "camelot"]
+
+
+def test_cache_evicts_least_recently_used_pages(tmp_path):
+    cache = str(tmp_path / "cache")
+    for i, digest in enumerate(["old", "mid", "new"]):
+        finlense_pdf.store_page(digest, 1, {"engine": "camelot", "tables": [TABLE]}, cache)
+        path = finlense_pdf.cache_path(digest, 1, cache)
+        os.utime(path, (1000 + i, 1000 + i))
+    size = os.path.getsize(finlense_pdf.cache_path("new", 1, cache))
+
+    finlense_pdf.evict(cache, max_bytes=2 * size)
+
+    assert finlense_pdf.cached_page("old", 1, cache) is None
+    assert finlense_pdf.cached_page("mid", 1, cache) is not None
+    assert finlense_pdf.cached_page("new", 1, cache) is not None